@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+from kb_service import UPSTREAM_POLL_INTERVAL, create_service
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8502
+MAX_BODY = 1 << 20
+MAX_BATCH = 1000
+MAX_RESULTS = 100   # giới hạn trên của limit / top_n
+REFRESH_INTERVAL = UPSTREAM_POLL_INTERVAL    # dự phòng cho webhook; 0: chỉ chờ webhook báo thay đổi
+WEBHOOK_SECRET = os.environ.get("GITHUB_WEBHOOK_SECRET", "")
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+    500: "Internal Server Error"
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+# Số kết quả (limit / top_n): không có thì dùng mặc định, phải là số nguyên trong 1..MAX_RESULTS
+def _count(params, name, default):
+    value = params.get(name)
+    if value is None or value == "":
+        return default
+    if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= MAX_RESULTS:
+        raise ApiError(400, f"'{name}' must be an integer between 1 and {MAX_RESULTS}")
+    return value
+
+
+# Tham số chuỗi (body JSON của /batch có thể gửi số, list...)
+def _str(params, name):
+    value = params.get(name, "")
+    if not isinstance(value, str):
+        raise ApiError(400, f"'{name}' must be a string")
+    return value
+
+
+# === Một truy vấn: dùng chung cho GET và từng phần tử của POST /batch ===
+def run_query(service, op, params):
+    if op == "lookup":
+        return service.lookup(_str(params, "keyword"))
+    if op == "search":
+        return service.search(_str(params, "q"), _count(params, "limit", None))
+    if op == "ask":
+        return service.ask(_str(params, "q"), _count(params, "top_n", 3))
+    if op == "topics":
+        return service.topics()
+    if op == "classify":
+        predictions = service.predict_topics(_str(params, "q"), _count(params, "top_n", None))
+        return [{"topic": topic, "probability": prob} for topic, prob in predictions]
+    if op == "keywords":
+        topics = params.get("topics") or params.get("topic")
+        if isinstance(topics, str):
+            topics = [topics]
+        if topics is not None and not (isinstance(topics, list) and all(isinstance(t, str) for t in topics)):
+            raise ApiError(400, "'topics' must be a string or a list of strings")
+        return service.keywords(topics)
+    raise ApiError(404, f"Unknown operation: {op}")
+
+
+# === Webhook "push" của GitHub: tải lại ở thread nền, các process khác được báo qua tem phiên bản ===
+def _github_hook(service, method, headers, body):
+    if method != "POST":
+        raise ApiError(405, "Use POST for /hooks/github")
+    if WEBHOOK_SECRET:
+        expected = "sha256=" + hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected, (headers or {}).get("x-hub-signature-256", "")):
+            raise ApiError(400, "Invalid signature")
+    threading.Thread(target=service.refresh_upstream, name="kb-github-hook", daemon=True).start()
+    return {"status": "accepted"}
+
+
+def handle_request(service, method, target, body, headers=None):
+    url = urlsplit(target)
+    path = url.path.strip("/")
+    if path == "health":
+        return {"status": "ok", "version": list(service.kb.version)}
+    if path == "hooks/github":
+        return _github_hook(service, method, headers, body)
+    if path == "batch":
+        if method != "POST":
+            raise ApiError(405, "Use POST for /batch")
+        try:
+            queries = json.loads(body or b"{}").get("requests", [])
+        except (ValueError, AttributeError):
+            raise ApiError(400, "Body must be JSON: {\"requests\": [...]}")
+        if not isinstance(queries, list) or not all(isinstance(query, dict) for query in queries):
+            raise ApiError(400, "\"requests\" must be a list of JSON objects")
+        if len(queries) > MAX_BATCH:
+            raise ApiError(413, f"At most {MAX_BATCH} requests per batch")
+        results = []
+        for query in queries:
+            try:
+                results.append({"result": run_query(service, query.get("op"), query)})
+            except ApiError as e:
+                results.append({"error": str(e)})
+        return {"results": results}
+    if method != "GET":
+        raise ApiError(405, f"Use GET for /{path}")
+    params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    if "topic" in params:
+        params["topics"] = parse_qs(url.query)["topic"]
+    return {"result": run_query(service, path, params)}
+
+
+# === HTTP/1.1 tối giản trên asyncio: giữ kết nối (keep-alive), trả JSON ===
+async def _serve_connection(service, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode("latin-1").split()
+            except ValueError:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            length = _int(headers.get("content-length"), 0)
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            try:
+                if length > MAX_BODY:
+                    raise ApiError(413, "Body too large")
+                body = await reader.readexactly(length) if length else b""
+                # Chạy ở thread riêng: lần dựng lại dữ liệu hay truy vấn chậm không chặn các kết nối khác
+                payload = await asyncio.to_thread(handle_request, service, method, target, body, headers)
+                status = 200
+            except ApiError as e:
+                status, payload = e.status, {"error": str(e)}
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except Exception as e:
+                # Lỗi bất ngờ: trả 500 thay vì đóng kết nối
+                status, payload = 500, {"error": f"Internal error: {type(e).__name__}"}
+
+            data = json.dumps(payload, ensure_ascii=False, default=str).encode()
+            writer.write(
+                f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+            )
+            await writer.drain()
+            if not keep_alive or status == 413:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, refresh_interval=None):
+    server = await asyncio.start_server(
+        lambda r, w: _serve_connection(service, r, w), host, port
+    )
+    service.start_upstream_poll(refresh_interval)
+    async with server:
+        await server.serve_forever()
+
+
+# === Chạy API trong thread nền của process Streamlit để dùng chung chỉ mục với UI ===
+def start_in_thread(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    thread = threading.Thread(
+        target=lambda: asyncio.run(serve(service, host, port)),
+        name="kb-api",
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Call Center Chatbot lookup/search API")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--refresh-interval", type=int, default=REFRESH_INTERVAL,
+        help="số giây giữa các lần hỏi GitHub (0: tắt, chỉ dùng POST /hooks/github)"
+    )
+    args = parser.parse_args()
+    service = create_service()
+    print(f"Serving on http://{args.host}:{args.port}")
+    asyncio.run(serve(service, args.host, args.port, args.refresh_interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+from benchmarks.kb_generator import TOPICS, generate_kb, write_topic_csvs
+from dedup import NearDuplicateIndex
+from github_fetch import GitHubCsvSource
+from kb_db import KeywordDatabase
+from kb_index import KnowledgeBaseIndex
+from kb_ingest import UploadIngestor
+from kb_snapshot import read_snapshot, write_snapshot
+from kb_store import KnowledgeBase, dedupe
+from retrieval import BM25Retriever
+from search import KeywordSearchEngine
+from topic_classifier import TopicClassifier
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+
+
+def _median_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def _per_op_times(fn, args):
+    times = []
+    for arg in args:
+        start = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _p99(times):
+    return sorted(times)[min(int(len(times) * 0.99), len(times) - 1)]
+
+
+# Giống nhánh "🔄 Cập nhật từ khóa đã có" khi admin tải file lên
+def upload_merge(update_df, old_df):
+    merged_df = pd.merge(update_df, old_df[["key word", "topic"]], on="key word", how="left", suffixes=("", "_old"))
+    merged_df["topic"] = merged_df["topic"].combine_first(merged_df["topic_old"])
+    merged_df.drop(columns=["topic_old"], inplace=True)
+    merged_df["topic"] = merged_df["topic"].fillna("Tải lên")
+    return merged_df
+
+
+def _typed_queries(keywords, rng, n):
+    # Mô phỏng gõ phím: mọi tiền tố của một số từ khóa, có và không có dấu
+    queries = []
+    while len(queries) < n:
+        kw = rng.choice(keywords)
+        text = kw if rng.random() < 0.5 else kw.lower()
+        queries.extend(text[:i] for i in range(1, min(len(text), 12) + 1))
+    return queries[:n]
+
+
+# === Chạy toàn bộ phép đo cho một kích thước kho dữ liệu ===
+def bench_size(n_rows, repeat, n_ops, seed=0):
+    rng = random.Random(seed)
+    df = generate_kb(n_rows, seed=seed)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_dir = os.path.join(tmp, "csv")
+        names = write_topic_csvs(df, csv_dir)
+        source = GitHubCsvSource("http://127.0.0.1:9/", cache_dir=csv_dir)
+        source.manifest["listing"] = [{"name": name} for name in names]
+        results["load_csvs"] = _median_time(source.load_dataframe, repeat)
+
+        update_df = df.sample(frac=0.1, random_state=seed)[["key word", "description"]].copy()
+        update_df["topic"] = None
+        results["upload_merge"] = _median_time(lambda: upload_merge(update_df, df), repeat)
+
+        def store_upload():
+            db = KeywordDatabase(os.path.join(tmp, f"kb-{time.perf_counter_ns()}.db"))
+            db.upsert_many(df.itertuples(index=False))
+        results["upload_store"] = _median_time(store_upload, repeat)
+
+        # Luồng tải lên mới: đọc theo lô + hash join topic + một giao dịch, trên kho đã có dữ liệu
+        db = KeywordDatabase(os.path.join(tmp, "ingest.db"))
+        db.upsert_many(df.itertuples(index=False))
+        update_csv = update_df[["key word", "description"]].to_csv(index=False).encode()
+
+        def ingest_upload():
+            upload = io.BytesIO(update_csv)
+            upload.name = "upload.csv"
+            UploadIngestor(db).ingest([upload])
+        results["upload_ingest"] = _median_time(ingest_upload, repeat)
+
+    results["dedupe"] = _median_time(lambda: dedupe(df), repeat)
+
+    results["index_build"] = _median_time(lambda: KnowledgeBaseIndex.from_dataframe(df), repeat)
+    index = KnowledgeBaseIndex.from_dataframe(df)
+    keywords = index.all_keywords
+
+    lookups = [rng.choice(keywords) for _ in range(n_ops)]
+    results["lookup"] = statistics.mean(_per_op_times(index.lookup, lookups))
+    results["multi_lookup_10"] = _median_time(lambda: index.lookup_many(lookups[:10]), repeat)
+
+    topic_sets = [rng.sample(TOPICS, 2) for _ in range(n_ops)]
+    results["topic_filter"] = statistics.mean(_per_op_times(index.keywords_for_topics, topic_sets))
+    pin_sets = [rng.sample(keywords, min(20, len(keywords))) for _ in range(n_ops)]
+    results["pinned_filter"] = statistics.mean(_per_op_times(index.pinned_by_topic, pin_sets))
+
+    results["search_build"] = _median_time(lambda: KeywordSearchEngine.from_kb_index(index), 1)
+    # Tắt bộ nhớ đệm để đo đúng chi phí mỗi lần gõ phím
+    engine = KeywordSearchEngine.from_kb_index(index)
+    engine._cache_size = 0
+    search_times = _per_op_times(engine.search, _typed_queries(keywords, rng, n_ops))
+    results["search_fn"] = statistics.median(search_times)
+    results["search_fn_p99"] = _p99(search_times)
+
+    near_duplicates = NearDuplicateIndex()
+    results["near_dup_build"] = _median_time(lambda: near_duplicates.sync(index.iter_rows()), 1)
+
+    retriever = BM25Retriever()
+    start = time.perf_counter()
+    retriever.sync(index.iter_rows())
+    retriever.search("hoc phi")
+    results["bm25_build"] = time.perf_counter() - start
+    questions = [" ".join(rng.choice(keywords).split()[:3]) for _ in range(n_ops)]
+    results["bm25_ask"] = statistics.mean(_per_op_times(retriever.search, questions))
+
+    classifier = TopicClassifier()
+    results["topic_train"] = _median_time(lambda: classifier.sync(index.iter_rows()), 1)
+    results["topic_route"] = statistics.mean(_per_op_times(classifier.route, questions))
+
+    # Khởi động từ snapshot dựng sẵn thay vì đọc CSV rồi dựng lại mọi chỉ mục
+    kb = KnowledgeBase(("bench", n_rows), index.iter_rows())
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "kb.snapshot")
+        results["snapshot_write"] = _median_time(lambda: write_snapshot(path, kb, retriever, near_duplicates, classifier), 1)
+        results["snapshot_load"] = _median_time(lambda: read_snapshot(path), repeat)
+    return results
+
+
+# === So sánh với ngưỡng cố định và (tuỳ chọn) với một lần chạy trước ===
+def check_regressions(report, thresholds=None, baseline=None, tolerance=0.25):
+    failures = []
+    for name, by_size in report["results"].items():
+        for size, seconds in by_size.items():
+            limit = (thresholds or {}).get(name, {}).get(size)
+            if limit is not None and seconds > limit:
+                failures.append(f"{name}[{size}]: {seconds:.6f}s > threshold {limit:.6f}s")
+            previous = (baseline or {}).get("results", {}).get(name, {}).get(size)
+            if previous and seconds > previous * (1 + tolerance):
+                failures.append(f"{name}[{size}]: {seconds:.6f}s > baseline {previous:.6f}s (+{tolerance:.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for load, dedupe, lookup and search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--ops", type=int, default=500, help="số truy vấn cho các phép đo từng thao tác")
+    parser.add_argument("--output", default=None, help="file JSON để lưu kết quả")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--baseline", default=None, help="file JSON kết quả của lần chạy trước")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "sizes": args.sizes,
+        },
+        "results": {},
+    }
+    for size in args.sizes:
+        print(f"== {size} rows", flush=True)
+        for name, seconds in bench_size(size, args.repeat, args.ops).items():
+            report["results"].setdefault(name, {})[str(size)] = seconds
+            print(f"  {name:<16} {seconds * 1000:10.3f} ms", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    thresholds = None
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = check_regressions(report, thresholds, baseline, args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import os
+import random
+
+import pandas as pd
+
+from kb_index import KB_COLUMNS
+
+TOPICS = ["Admissions", "Majors", "Tuition", "Scholarships", "Curriculum", "CC_Script", "Hard_Questions"]
+
+SYLLABLES = [
+    "học", "phí", "bổng", "tuyển", "sinh", "ngành", "thời", "gian", "ký", "túc", "xá", "đại", "trường",
+    "khoa", "chương", "trình", "viên", "mùa", "thu", "xuân", "hồ", "sơ", "nộp", "đơn", "điểm", "thi",
+    "năm", "kỳ", "lớp", "môn", "giảng", "dạy", "nghiên", "cứu", "kinh", "tế", "văn", "lịch", "sử",
+    "tâm", "lý", "máy", "tính", "toán", "kỹ", "thuật", "hỗ", "trợ", "tài", "chính", "phỏng", "vấn",
+    "bài", "luận", "thư", "giới", "thiệu", "chứng", "chỉ", "tiếng", "anh", "phụ", "huynh", "liên", "hệ",
+]
+
+
+def _phrase(rng, low, high):
+    return " ".join(rng.choice(SYLLABLES) for _ in range(rng.randint(low, high)))
+
+
+# === Sinh kho dữ liệu giả lập cùng dạng `key word, description, topic` ===
+def generate_kb(n_rows, seed=0, duplicate_ratio=0.05):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        if rows and rng.random() < duplicate_ratio:
+            # Một phần nhỏ trùng lặp để có việc cho bước loại trùng
+            keyword, description, topic = rng.choice(rows)
+            if rng.random() < 0.5:
+                keyword = f"{keyword} {i}"
+            rows.append((keyword, description, topic))
+            continue
+        keyword = f"{_phrase(rng, 2, 5).capitalize()} {i}"
+        description = _phrase(rng, 20, 80).capitalize() + "."
+        rows.append((keyword, description, rng.choice(TOPICS)))
+    return pd.DataFrame(rows, columns=KB_COLUMNS)
+
+
+# === Ghi ra từng file theo topic (giống Admissions.csv, Majors.csv, ...) ===
+def write_topic_csvs(df, directory):
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for topic, group in df.groupby("topic"):
+        name = f"{topic}.csv"
+        group[["key word", "description"]].to_csv(os.path.join(directory, name), index=False)
+        names.append(name)
+    return sorted(names)
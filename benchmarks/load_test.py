@@ -0,0 +1,218 @@
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.kb_generator import generate_kb
+
+APP_FILE = os.path.join(ROOT, "chat_bot.py")
+ADMIN_PASSWORD = "ADMIN123@"
+DEFAULT_SESSIONS = [1, 5, 10, 20]
+QUESTIONS = ["học phí bao nhiêu", "hoc bong nhu the nao", "thời gian tuyển sinh", "ky tuc xa"]
+
+
+# AppTest tạo ScriptCache mới cho mỗi lần chạy, còn server thật dùng chung một cái cho mọi phiên.
+# Dùng chung bytecode ở đây cho giống server (và vì ast.parse không an toàn khi nhiều thread cùng gọi).
+_bytecode_lock = threading.Lock()
+_bytecode = {}
+_get_bytecode = ScriptCache.get_bytecode
+
+
+def _shared_get_bytecode(self, script_path):
+    with _bytecode_lock:
+        if script_path not in _bytecode:
+            _bytecode[script_path] = _get_bytecode(self, script_path)
+        return _bytecode[script_path]
+
+
+ScriptCache.get_bytecode = _shared_get_bytecode
+
+# AppTest gán rồi xoá Runtime._instance sau mỗi lần chạy; nhiều phiên song song sẽ giẫm lên nhau,
+# nên giữ lại runtime giả gần nhất như một server chỉ có một runtime cho cả process.
+_last_runtime = []
+
+
+def _shared_runtime(cls):
+    if cls._instance is not None:
+        _last_runtime[:] = [cls._instance]
+    if not _last_runtime:
+        raise RuntimeError("Runtime hasn't been created!")
+    return _last_runtime[0]
+
+
+Runtime.instance = classmethod(_shared_runtime)
+Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(_last_runtime))
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Không có /proc: dùng RSS cao nhất (Linux trả KB)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+# === Kịch bản của một nhân viên: gõ câu hỏi, chọn chủ đề, ghim, chọn nhiều từ khóa, (admin) tải file ===
+class AgentSession:
+    def __init__(self, session_id, rng, is_admin, upload_csv, timeout):
+        self.session_id = session_id
+        self.rng = rng
+        self.is_admin = is_admin
+        self.upload_csv = upload_csv
+        self.at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+        self.latencies = []
+        self.errors = []
+
+    def _timed(self, label, action):
+        start = time.perf_counter()
+        action()
+        self.latencies.append(time.perf_counter() - start)
+        if self.at.exception:
+            self.errors.append(f"{label}: {self.at.exception[0].value}")
+
+    def _sidebar_multiselect(self, label):
+        return next(m for m in self.at.sidebar.multiselect if m.label == label)
+
+    def run(self):
+        at = self.at
+        self._timed("load", at.run)
+
+        # st_searchbox là custom component nên AppTest không gõ được; ô câu hỏi cũng rerun theo từng lần gõ
+        question = self.rng.choice(QUESTIONS)
+        for i in range(1, len(question) + 1, 3):
+            self._timed("keystroke", at.text_input(key="free_text_question").input(question[:i]).run)
+
+        topics = self._sidebar_multiselect("Chọn chủ đề:")
+        chosen = self.rng.sample(topics.options, min(2, len(topics.options)))
+        for topic in chosen:
+            self._timed("topic", self._sidebar_multiselect("Chọn chủ đề:").select(topic).run)
+
+        catalog = at.selectbox(key="catalog_topic")
+        self._timed("catalog", catalog.set_value(catalog.options[0]).run)
+        pins = [b for b in at.sidebar.button if b.key and b.key.startswith("pin-")]
+        if pins:
+            self._timed("pin", self.rng.choice(pins).click().run)
+
+        multi = self._sidebar_multiselect("Chọn nhiều từ khóa:")
+        for kw in self.rng.sample(multi.options, min(2, len(multi.options))):
+            self._timed("multi", self._sidebar_multiselect("Chọn nhiều từ khóa:").select(kw).run)
+
+        if self.is_admin:
+            self._timed("admin_login", at.sidebar.text_input(key="colead_password").input(ADMIN_PASSWORD).run)
+            self._timed("admin_rerun", at.run)
+            self._timed("admin_action", at.radio(key="co_action").set_value("📤 Tải file CSV mới").run)
+            upload = at.file_uploader[0].upload(f"upload_{self.session_id}.csv", self.upload_csv, "text/csv")
+            self._timed("admin_upload", upload.run)
+
+
+# === Chạy N phiên đồng thời trong cùng một process (dùng chung cache như một replica) ===
+def run_load(n_sessions, seed, admin_ratio, upload_csv, timeout):
+    rng = random.Random(seed)
+    sessions = [
+        AgentSession(i, random.Random(rng.random()), i < max(1, int(n_sessions * admin_ratio)), upload_csv, timeout)
+        for i in range(n_sessions)
+    ]
+    gc.collect()
+    rss_before = _rss_bytes()
+    barrier = threading.Barrier(n_sessions)
+
+    def worker(session):
+        barrier.wait()
+        try:
+            session.run()
+        except Exception as e:
+            session.errors.append(f"{type(e).__name__}: {e}")
+
+    threads = [threading.Thread(target=worker, args=(s,)) for s in sessions]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    rss_after = _rss_bytes()
+
+    latencies = [lat for s in sessions for lat in s.latencies]
+    errors = [err for s in sessions for err in s.errors]
+    return {
+        "sessions": n_sessions,
+        "reruns": len(latencies),
+        "wall_s": wall,
+        "reruns_per_s": len(latencies) / wall if wall else 0.0,
+        "p50_s": _percentile(latencies, 0.50) if latencies else None,
+        "p95_s": _percentile(latencies, 0.95) if latencies else None,
+        "p99_s": _percentile(latencies, 0.99) if latencies else None,
+        "mean_s": statistics.mean(latencies) if latencies else None,
+        "rss_per_session_mb": (rss_after - rss_before) / n_sessions / 2**20,
+        "rss_total_mb": rss_after / 2**20,
+        "errors": errors[:20],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-agent load test for chat_bot.py using AppTest")
+    parser.add_argument("--sessions", type=int, nargs="+", default=DEFAULT_SESSIONS)
+    parser.add_argument("--kb-rows", type=int, default=3000)
+    parser.add_argument("--admin-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", default=None, help="file JSON để lưu kết quả")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    # Chạy trong thư mục tạm với kho dữ liệu giả lập, không đụng tới dữ liệu thật
+    workdir = tempfile.mkdtemp(prefix="cc_load_")
+    os.chdir(workdir)
+    generate_kb(args.kb_rows, seed=args.seed).to_csv("uploaded_keywords.csv", index=False)
+    upload_csv = generate_kb(50, seed=args.seed + 1)[["key word", "description"]].to_csv(index=False).encode()
+
+    # Làm nóng: dựng kho dữ liệu dùng chung một lần trước khi đo
+    AppTest.from_file(APP_FILE, default_timeout=args.timeout).run()
+
+    report = {
+        "meta": {"time": datetime.now().isoformat(timespec="seconds"), "kb_rows": args.kb_rows},
+        "results": [],
+    }
+    try:
+        for n in args.sessions:
+            result = run_load(n, args.seed, args.admin_ratio, upload_csv, args.timeout)
+            report["results"].append(result)
+            print(
+                f"N={n:<4} reruns={result['reruns']:<5} p50={result['p50_s'] * 1000:8.1f} ms "
+                f"p95={result['p95_s'] * 1000:8.1f} ms p99={result['p99_s'] * 1000:8.1f} ms "
+                f"rss/session={result['rss_per_session_mb']:6.1f} MB errors={len(result['errors'])}",
+                flush=True
+            )
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
-import pandas as pd
 import streamlit as st
-import requests
-import json
 import uuid
 import os
 from streamlit_searchbox import st_searchbox
 from datetime import datetime, timedelta
+from kb_service import create_service, DB_FILE, UPLOADED_FILE, GITHUB_CACHE_DIR
+from api_server import start_in_thread
+from pin_store import PinStore
+from chat_history import ChatHistory, JsonlHistorySink, HISTORY_LIMIT, HISTORY_PAGE_SIZE
+from perf import PerfRecorder
+from kb_ingest import UploadIngestor, IngestError, UPDATE_EXISTING, NEW_TOPIC
 
 # === App Title ===
 st.set_page_config(page_title="Call Center Chatbot", layout="wide")
@@ -13,7 +16,12 @@ st.title("📞 Call Center Chatbot")
 
 # === Constants ===
 PINNED_FILE = "pinned_keywords.json"
-UPLOADED_FILE = "uploaded_keywords.csv"
+CATALOG_PAGE_SIZE = 20
+POPULAR_SIDEBAR = 5        # số từ khóa hay dùng hiện ở sidebar
+POPULAR_SUGGESTIONS = 10   # số gợi ý hiện sẵn trong ô tìm kiếm trước khi gõ
+API_PORT = os.environ.get("KB_API_PORT")  # đặt cổng để bật API tra cứu cho softphone/CRM
+HISTORY_LOG_FILE = os.environ.get("CHAT_HISTORY_LOG")  # để trống: không ghi lịch sử ra file
+PERF_LOG_FILE = os.environ.get("PERF_LOG_FILE", "perf_spans.jsonl")  # để trống: chỉ giữ số liệu trong bộ nhớ
 
 # === User Identification via Cookie ===
 if "user_id" not in st.session_state:
@@ -25,37 +33,47 @@ if "user_id" not in st.session_state:
 
 user_id = st.session_state["user_id"]
 
+# === Đo thời gian từng phase của mỗi lần rerun (dùng chung cho mọi phiên) ===
+@st.cache_resource
+def get_perf_recorder():
+    return PerfRecorder(PERF_LOG_FILE or None)
+
+perf_rerun = get_perf_recorder().start(user_id)
+perf_rerun.phase("session_setup")
+
+# st.rerun() dừng script ngay: ghi lại lần chạy này (đánh dấu bị ngắt) trước khi chạy lại
+def rerun():
+    perf_rerun.end(interrupted=True)
+    st.rerun()
+
 # === Đăng xuất / Tạo người dùng mới ===
 with st.sidebar:
     if st.button("🔄 Đăng xuất / Tạo người dùng mới"):
         new_id = f"user_{uuid.uuid4().hex[:8]}"
         st.query_params["uid"] = new_id
-        st.rerun()
+        rerun()
 
-# === Load pinned keywords from file ===
+# === Pinned keywords: dùng chung một store cho mọi phiên ===
+@st.cache_resource
+def get_pin_store():
+    return PinStore(DB_FILE, legacy_json=PINNED_FILE)
+
+# === Load pinned keywords ===
 def load_pinned_keywords():
-    try:
-        with open(PINNED_FILE, "r") as f:
-            all_pins = json.load(f)
-            return all_pins.get(user_id, [])
-    except:
-        return []
-
-# === Save pinned keywords to file ===
+    return get_pin_store().get(user_id)
+
+# === Save pinned keywords ===
 def save_pinned_keywords(pins):
-    all_pins = {}
-    try:
-        with open(PINNED_FILE, "r") as f:
-            all_pins = json.load(f)
-    except:
-        pass
-    all_pins[user_id] = pins
-    with open(PINNED_FILE, "w") as f:
-        json.dump(all_pins, f)
+    get_pin_store().set(user_id, pins)
+
+# === Ghi lịch sử ra file (tuỳ chọn), dùng chung cho mọi phiên ===
+@st.cache_resource
+def get_history_sink():
+    return JsonlHistorySink(HISTORY_LOG_FILE) if HISTORY_LOG_FILE else None
 
 # === Session state setup ===
 if "chat_history" not in st.session_state:
-    st.session_state["chat_history"] = []
+    st.session_state["chat_history"] = ChatHistory(user_id, HISTORY_LIMIT, sink=get_history_sink())
 if "selected_keyword" not in st.session_state:
     st.session_state["selected_keyword"] = None
 if "pinned_keywords" not in st.session_state:
@@ -66,113 +84,45 @@ if "selected_topics" not in st.session_state:
     st.session_state["selected_topics"] = []
 if "trigger_display" not in st.session_state:
     st.session_state["trigger_display"] = False
+if "selection_seq" not in st.session_state:
+    st.session_state["selection_seq"] = 0
 if "is_authorized" not in st.session_state:
     st.session_state["is_authorized"] = False 
 
-# === Load uploaded file nếu đã tồn tại ===
-all_dataframes = []
-if os.path.exists(UPLOADED_FILE):
-    try:
-        uploaded_df = pd.read_csv(UPLOADED_FILE)
-        uploaded_df.columns = uploaded_df.columns.str.lower().str.strip()
-        if {"key word", "description", "topic"}.issubset(uploaded_df.columns):
-            all_dataframes.append(uploaded_df)
-            st.session_state["uploaded_data"] = uploaded_df
-    except Exception as e:
-        st.warning(f"⚠️ Không thể đọc file đã lưu: {e}")
-
-# === GitHub Info ===
-GITHUB_USER = "mintus2511"
-GITHUB_REPO = "CC_Chatbot"
-GITHUB_API_URL = f"https://api.github.com/repos/{GITHUB_USER}/{GITHUB_REPO}/contents/"
-
-@st.cache_data(ttl=60)
-def get_csv_file_links():
-    try:
-        response = requests.get(GITHUB_API_URL)
-        response.raise_for_status()
-        files = response.json()
-        sorted_csvs = sorted(
-            [file for file in files if file["name"].endswith(".csv")],
-            key=lambda x: x["name"]
-        )
-        return {
-            file["name"]: file["download_url"]
-            for file in sorted_csvs
-        }
-    except Exception as e:
-        st.warning(f"⚠️ Lỗi khi lấy danh sách file từ GitHub: {e}")
-        return {}
-
-@st.cache_data(ttl=60)
-def load_csvs(csv_files):
-    combined = pd.DataFrame(columns=["key word", "description", "topic"])
-    for name, url in csv_files.items():
-        try:
-            df = pd.read_csv(url)
-            df.columns = df.columns.str.lower().str.strip()
-            if {"key word", "description"}.issubset(df.columns):
-                df["topic"] = name.replace(".csv", "")
-                combined = pd.concat([combined, df], ignore_index=True)
-        except Exception as e:
-            st.warning(f"⚠️ Không thể đọc {name} từ GitHub: {e}")
-    return combined
-
-# Nếu đã có dữ liệu upload từ file local thì ưu tiên dùng trước
-if "uploaded_data" in st.session_state:
-    data = st.session_state["uploaded_data"]
-    data = data.drop_duplicates(subset="key word", keep="last")
-    data = data.drop_duplicates(subset="description", keep="first")
-
-# Nếu chưa có, thì thử đọc từ file local
-elif os.path.exists(UPLOADED_FILE):
-    try:
-        uploaded_df = pd.read_csv(UPLOADED_FILE)
-        uploaded_df.columns = uploaded_df.columns.str.lower().str.strip()
-        if {"key word", "description", "topic"}.issubset(uploaded_df.columns):
-            st.session_state["uploaded_data"] = uploaded_df
-            data = uploaded_df
-            data = data.drop_duplicates(subset="key word", keep="last")
-            data = data.drop_duplicates(subset="description", keep="first")
-        else:
-            st.warning("⚠️ File local không đúng định dạng.")
-            data = pd.DataFrame()
-    except Exception as e:
-        st.warning(f"⚠️ Lỗi đọc file local: {e}")
-        data = pd.DataFrame()
-
-# Nếu không có local thì mới tải từ GitHub
-else:
-    try:
-        csv_files = get_csv_file_links()
-        github_df = load_csvs(csv_files)
-        if not github_df.empty:
-            data = github_df
-        else:
-            data = pd.DataFrame()
-    except Exception as e:
-        st.warning(f"⚠️ Không thể tải từ GitHub: {e}")
-        data = pd.DataFrame()
-
-
-# Gộp toàn bộ dữ liệu từ GitHub + file upload để có thể chỉnh sửa
-if all_dataframes:
-    all_data_combined = pd.concat(all_dataframes, ignore_index=True)
-else:
-    all_data_combined = pd.DataFrame(columns=["key word", "description", "topic"])
-
-def display_bot_response(keyword, description, topic):
+# === Service tra cứu dùng chung cho mọi phiên; mỗi phiên chỉ giữ tham chiếu ===
+@st.cache_resource
+def get_service():
+    service = create_service(DB_FILE, UPLOADED_FILE, cache_dir=GITHUB_CACHE_DIR)
+    # Không chạy API (không nhận webhook) thì vẫn thấy thay đổi trên GitHub nhờ hỏi định kỳ ở nền
+    # (chỉ một process trong các replica hỏi, các process khác theo tem phiên bản)
+    service.start_upstream_poll()
+    # API HTTP chạy trong cùng process nên dùng chung chỉ mục với UI
+    if API_PORT:
+        start_in_thread(service, port=int(API_PORT))
+    return service
+
+def load_kb():
+    # Không hỏi lại GitHub mỗi lần rerun: dữ liệu chỉ dựng lại khi có thông báo thay đổi (ghi SQLite, tem phiên bản, webhook, hỏi định kỳ)
+    service = get_service()
+    kb = service.kb
+    for warning in service.refresh_errors + kb.warnings:
+        st.warning(f"⚠️ {warning}")
+    return kb
+
+perf_rerun.phase("data_load")
+service = get_service()
+kb = load_kb()
+kb_db = service.db
+
+def display_bot_response(keyword, description, topic, event):
     st.chat_message("user").markdown(f"🔍 **Từ khóa:** {keyword}")
     st.chat_message("assistant").markdown(
         f"**📂 Chủ đề:** {topic}\n\n{description}"
     )
-    st.session_state["chat_history"].append({
-        "keyword": keyword,
-        "description": description,
-        "topic": topic
-    })
+    st.session_state["chat_history"].record(keyword, description, topic, event=event)
 
 # === Co-lead Authorization Section ===
+perf_rerun.phase("admin")
 with st.sidebar:
     st.markdown("---")
     with st.expander("Admin Request", expanded=False):
@@ -181,7 +131,7 @@ with st.sidebar:
             if code == "ADMIN123@":
                 st.session_state["is_authorized"] = True
                 st.success("✅ Xác thực thành công. Bạn có quyền tải lên dữ liệu mới.")
-                st.rerun()
+                rerun()
             elif code:
                 st.error("❌ Mã truy cập không đúng")
         else:
@@ -189,7 +139,7 @@ with st.sidebar:
             if st.button("🚪 Thoát chế độ Admin"):
                 st.session_state["is_authorized"] = False
                 st.success("✅ Bạn đã thoát khỏi chế độ Admin.")
-                st.rerun()
+                rerun()
 
 # === Upload hoặc Quản lý topic ===
 if st.session_state["is_authorized"]:
@@ -201,6 +151,35 @@ if st.session_state["is_authorized"]:
         horizontal=True,
         key="co_action"
     )
+    st.download_button(
+        "⬇️ Xuất dữ liệu ra CSV",
+        data=kb_db.export_csv,
+        file_name=UPLOADED_FILE,
+        mime="text/csv"
+    )
+    with st.expander("⏱️ Hiệu năng (các lần chạy gần đây)", expanded=False):
+        perf_recorder = get_perf_recorder()
+        answers = service.answers
+        st.caption(f"Cache câu trả lời: {answers.hits} lần dùng lại / {answers.misses} lần tính mới, {len(answers)} mục")
+        st.markdown("**Phase chậm nhất (tổng hợp)**")
+        st.dataframe(perf_recorder.aggregates(), hide_index=True)
+        st.markdown("**Các lần rerun gần nhất (ms)**")
+        st.dataframe([
+            {
+                "time": record["time"],
+                "session": record["session"],
+                "total": record["total_ms"],
+                "interrupted": record["interrupted"],
+                **{s["name"]: s["ms"] for s in record["spans"] if s["depth"] == 0}
+            }
+            for record in perf_recorder.recent()
+        ], hide_index=True)
+    near_duplicates = service.near_duplicates()
+    with st.expander(f"🧬 Mô tả gần trùng nhau ({len(near_duplicates)} cặp)", expanded=False):
+        if near_duplicates:
+            st.dataframe(near_duplicates, hide_index=True)
+        else:
+            st.info("Không có mô tả nào gần trùng nhau.")
 
     if co_action == "📤 Tải file CSV mới":
         upload_mode = st.radio(
@@ -213,55 +192,37 @@ if st.session_state["is_authorized"]:
         uploaded_files = st.file_uploader("Chọn file CSV", type="csv", accept_multiple_files=True)
 
         if uploaded_files:
-            for uploaded_file in uploaded_files:
-                try:
-                    update_df = pd.read_csv(uploaded_file)
-                    update_df.columns = update_df.columns.str.lower().str.strip()
-                    if {"key word", "description"}.issubset(update_df.columns):
-                        if "uploaded_data" in st.session_state:
-                            old_df = st.session_state["uploaded_data"]
-                        elif os.path.exists(UPLOADED_FILE):
-                            old_df = pd.read_csv(UPLOADED_FILE)
-                            old_df.columns = old_df.columns.str.lower().str.strip()
-                        else:
-                            old_df = pd.DataFrame(columns=["key word", "description", "topic"])
-
-                        if "topic" not in update_df.columns:
-                            update_df["topic"] = None
-
-                        if st.session_state["upload_mode"] == "🔄 Cập nhật từ khóa đã có":
-                            merged_df = pd.merge(update_df, old_df[['key word', 'topic']], on='key word', how='left', suffixes=('', '_old'))
-                            merged_df['topic'] = merged_df['topic'].combine_first(merged_df['topic_old'])
-                            merged_df.drop(columns=['topic_old'], inplace=True)
-                            merged_df['topic'] = merged_df['topic'].fillna('Tải lên')
-                        else:
-                            default_topic = os.path.splitext(uploaded_file.name)[0]
-                            custom_topic = st.text_input(f"📝 Đặt tên cho topic mới cho file {uploaded_file.name}:", value=default_topic, key=f"topic_name_{uploaded_file.name}")
-                            update_df['topic'] = custom_topic
-                            merged_df = update_df
-
-                        # Gộp vào dữ liệu đang có trong session
-                        if "uploaded_data" in st.session_state:
-                            st.session_state["uploaded_data"] = pd.concat([
-                                st.session_state["uploaded_data"],
-                                merged_df[["key word", "description", "topic"]]
-                            ], ignore_index=True)
-                        else:
-                            st.session_state["uploaded_data"] = merged_df[["key word", "description", "topic"]]
-
-                        # Lưu vào file
-                        st.session_state["uploaded_data"].to_csv(UPLOADED_FILE, index=False)
-                        st.success(f"✅ Đã xử lý và lưu file: {uploaded_file.name}")
-                    else:
-                        st.error(f"❌ File {uploaded_file.name} không đúng định dạng. Cần có cột 'key word' và 'description'.")
-                except Exception as e:
-                    st.error(f"❌ Lỗi khi đọc file {uploaded_file.name}: {e}")
+            mode = UPDATE_EXISTING if st.session_state["upload_mode"] == "🔄 Cập nhật từ khóa đã có" else NEW_TOPIC
+            topic_names = {}
+            if mode == NEW_TOPIC:
+                for uploaded_file in uploaded_files:
+                    default_topic = os.path.splitext(uploaded_file.name)[0]
+                    topic_names[uploaded_file.name] = st.text_input(f"📝 Đặt tên cho topic mới cho file {uploaded_file.name}:", value=default_topic, key=f"topic_name_{uploaded_file.name}")
+
+            # Chỉ nạp lại khi danh sách file, chế độ hoặc tên topic thay đổi (không ghi lại ở mỗi rerun)
+            upload_key = (mode, tuple((f.file_id, topic_names.get(f.name)) for f in uploaded_files))
+            if st.session_state.get("upload_key") != upload_key:
+                progress_bar = st.progress(0.0, text="⏳ Đang xử lý file...")
+                st.session_state["upload_results"] = UploadIngestor(kb_db).ingest(
+                    uploaded_files, mode, topic_names,
+                    progress=lambda fraction, text: progress_bar.progress(fraction, text=text)
+                )
+                st.session_state["upload_key"] = upload_key
+                progress_bar.empty()
+
+            for name, count, error in st.session_state["upload_results"]:
+                if error is None:
+                    st.success(f"✅ Đã xử lý và lưu file: {name} ({count:,} dòng)")
+                elif isinstance(error, IngestError):
+                    st.error(f"❌ File {name} không đúng định dạng. Cần có cột 'key word' và 'description'.")
+                else:
+                    st.error(f"❌ Lỗi khi đọc file {name}: {error}")
     elif co_action == "➕ Thêm từ khóa":
         st.markdown("---")
         st.subheader("🧾 Nhập từ khóa mới")
 
     # ✅ Hiển thị chọn hoặc nhập chủ đề mới - nằm ngoài form để phản ứng ngay lập tức
-        existing_topics = sorted(all_data_combined["topic"].dropna().unique())
+        existing_topics = kb_db.topics()
         topic_choice = st.selectbox(
             "📂 Chọn chủ đề (hoặc nhập mới)",
             options=["🔄 Nhập mới..."] + existing_topics,
@@ -282,22 +243,10 @@ if st.session_state["is_authorized"]:
             submitted = st.form_submit_button("✅ Lưu từ khóa mới")
             if submitted:
                 if keyword and description and topic:
-                    new_row = pd.DataFrame([{
-                        "key word": keyword,
-                        "description": description,
-                        "topic": topic
-                    }])
-
-                    if os.path.exists(UPLOADED_FILE):
-                        df_existing = pd.read_csv(UPLOADED_FILE)
-                    else:
-                        df_existing = pd.DataFrame(columns=["key word", "description", "topic"])
-
-                    df_combined = pd.concat([df_existing, new_row], ignore_index=True)
-                    df_combined.to_csv(UPLOADED_FILE, index=False)
+                    kb_db.upsert(keyword, description, topic)
 
                     st.success("✅ Đã thêm từ khóa mới thành công.")
-                    st.rerun()
+                    rerun()
                 else:
                     st.error("❗ Vui lòng điền đầy đủ cả 3 cột.")
 
@@ -305,12 +254,11 @@ if st.session_state["is_authorized"]:
     elif co_action in ["📝 Chỉnh sửa topic/key word/description", "🗑️ Xoá topic/key word"]:
         st.markdown("---")
         st.subheader("🗂️ Quản lý topic và từ khóa")
-        if os.path.exists(UPLOADED_FILE):
+        if kb_db.has_data():
             try:
-                df_all = st.session_state["uploaded_data"].copy()
-                all_topics = sorted(df_all['topic'].dropna().unique())
+                all_topics = kb_db.topics()
                 topic_to_edit = st.selectbox("📂 Chọn topic:", all_topics)
-                df_topic = df_all[df_all['topic'] == topic_to_edit].copy()
+                df_topic = kb_db.topic_dataframe(topic_to_edit)
 
             # === Hiển thị bảng có thể chỉnh sửa kèm cột chọn xoá
                 df_topic["🔘 Chọn xoá"] = False
@@ -323,23 +271,17 @@ if st.session_state["is_authorized"]:
 
             # === Lưu chỉnh sửa toàn bộ bảng
                 if st.button("💾 Lưu chỉnh sửa"):
-                    df_all = df_all[df_all['topic'] != topic_to_edit]
-                    df_all = pd.concat([df_all, edited_df.drop(columns=["🔘 Chọn xoá"])], ignore_index=True)
-                    df_all.to_csv(UPLOADED_FILE, index=False)
+                    kb_db.replace_topic(topic_to_edit, edited_df[["key word", "description", "topic"]].itertuples(index=False))
                     st.success("✅ Đã lưu chỉnh sửa thành công.")
-                    st.rerun()
+                    rerun()
 
                 # === Xoá từ khóa đã chọn
                 if st.button("🗑️ Xoá từ khóa đã chọn"):
                     to_delete = edited_df[edited_df["🔘 Chọn xoá"] == True]
                     if not to_delete.empty:
-                        df_all = df_all[~(
-                            (df_all["topic"] == topic_to_edit) &
-                            (df_all["key word"].isin(to_delete["key word"]))
-                        )]
-                        df_all.to_csv(UPLOADED_FILE, index=False)
+                        kb_db.delete(topic_to_edit, to_delete["key word"])
                         st.success(f"🗑️ Đã xoá {len(to_delete)} từ khóa khỏi topic.")
-                        st.rerun()
+                        rerun()
                     else:
                         st.warning("⚠️ Bạn chưa chọn từ khóa nào để xoá.")
 
@@ -347,149 +289,197 @@ if st.session_state["is_authorized"]:
                 if co_action == "📝 Chỉnh sửa topic/key word/description":
                     new_name = st.text_input("✏️ Đổi tên topic:", value=topic_to_edit)
                     if st.button("💾 Lưu tên topic mới") and new_name != topic_to_edit:
-                        df_all.loc[df_all['topic'] == topic_to_edit, 'topic'] = new_name
-                        df_all.to_csv(UPLOADED_FILE, index=False)
+                        kb_db.rename_topic(topic_to_edit, new_name)
                         st.success("✅ Đã đổi tên topic thành công.")
-                        st.rerun()
+                        rerun()
 
                 # === Xoá toàn bộ topic
                 elif co_action == "🗑️ Xoá topic":
                     if st.button("🗑️ Xoá toàn bộ topic này"):
-                        df_all = df_all[df_all['topic'] != topic_to_edit]
-                        df_all.to_csv(UPLOADED_FILE, index=False)
+                        kb_db.delete_topic(topic_to_edit)
                         st.success(f"🗑️ Đã xoá topic '{topic_to_edit}' cùng toàn bộ từ khóa liên quan.")
-                        st.rerun()
+                        rerun()
             except Exception as e:
                 st.error(f"❌ Không thể quản lý topic: {e}")
 
 
 
-if "uploaded_data" in st.session_state:
-    data = st.session_state["uploaded_data"]
-    data = data.drop_duplicates(subset="key word", keep="last")
-    data = data.drop_duplicates(subset="description", keep="first")
-elif os.path.exists(UPLOADED_FILE):
-    try:
-        uploaded_df = pd.read_csv(UPLOADED_FILE)
-        uploaded_df.columns = uploaded_df.columns.str.lower().str.strip()
-        if {"key word", "description", "topic"}.issubset(uploaded_df.columns):
-            st.session_state["uploaded_data"] = uploaded_df
-            data = uploaded_df
-            data = data.drop_duplicates(subset="key word", keep="last")
-            data = data.drop_duplicates(subset="description", keep="first")
-        else:
-            st.warning("⚠️ File local không đúng định dạng.")
-            data = pd.DataFrame()
-    except Exception as e:
-        st.warning(f"⚠️ Lỗi đọc file local: {e}")
-        data = pd.DataFrame()
-else:
-    try:
-        csv_files = get_csv_file_links()
-        github_df = load_csvs(csv_files)
-        if not github_df.empty:
-            data = github_df
-        else:
-            data = pd.DataFrame()
-    except Exception as e:
-        st.warning(f"⚠️ Không thể tải từ GitHub: {e}")
-        data = pd.DataFrame()
-
-# Nếu có dữ liệu upload từ co-lead, thêm vào
-if "uploaded_data" in st.session_state:
-    data = pd.concat([data, st.session_state["uploaded_data"]], ignore_index=True)
-    data = data.drop_duplicates(subset="key word", keep="last")
-    data = data.drop_duplicates(subset="description", keep="first")
+# Lấy lại phiên bản mới nhất nếu admin vừa thay đổi dữ liệu (chỉ admin chờ dựng lại, các phiên khác dùng bản cũ tới khi xong)
+perf_rerun.phase("data_refresh")
+kb = service.latest_kb() if st.session_state["is_authorized"] else service.kb
 
 def set_selected_keyword(keyword):
+    service.record_selection(keyword)
     st.session_state["selected_keyword"] = keyword
     st.session_state["trigger_display"] = True
+    st.session_state["selection_seq"] += 1
+
+# Mở một chủ đề trong danh mục (gọi trong on_click, trước khi selectbox được vẽ lại)
+def open_catalog_topic(topic):
+    st.session_state["catalog_topic"] = topic
+
+
+kb_index = kb.index
 
-if not data.empty:
-    all_keywords = sorted(data["key word"].dropna().astype(str).unique())
-    all_topics = sorted(data["topic"].dropna().unique())
+perf_rerun.phase("sidebar")
+if not kb_index.empty:
+    all_keywords = kb_index.all_keywords
+    all_topics = kb_index.all_topics
+
+    # Câu hỏi đang gõ (ô bên dưới) dùng để đoán chủ đề khi chưa chọn chủ đề nào: chỉ gợi ý và xếp lên trước,
+    # không ẩn chủ đề khác và không tự đổi chủ đề đang mở
+    question = st.session_state.get("free_text_question", "")
+    suggested_topics = service.route_topics(question) if question else []
 
     with st.sidebar:
         st.markdown("### 🧭 Chọn chủ đề (có thể chọn nhiều option)")
         selected_topics = st.multiselect("Chọn chủ đề:", all_topics)
         st.session_state["selected_topics"] = selected_topics
+        if suggested_topics and not selected_topics:
+            st.caption("🎯 Chủ đề đoán từ câu hỏi (bấm để mở trong danh mục):")
+            for topic in suggested_topics:
+                st.button(f"🎯 {topic}", key=f"guess-{topic}", on_click=open_catalog_topic, args=(topic,))
+
+        popular_keywords = service.popular_keywords(POPULAR_SIDEBAR, selected_topics)
+        if popular_keywords:
+            st.markdown("### 🔥 Từ khóa hay dùng")
+            for kw in popular_keywords:
+                if st.button(f"🔥 {kw}", key=f"popular-{kw}"):
+                    set_selected_keyword(kw)
+                    rerun()
 
         if st.session_state["pinned_keywords"]:
             st.markdown("### 📌 Từ khóa đã ghim")
             if st.button("Xóa tất cả từ khóa đã ghim"):
                 st.session_state["pinned_keywords"] = []
                 save_pinned_keywords([])
-                st.rerun()
-            pinned_df = data[data["key word"].isin(st.session_state["pinned_keywords"])]
-            for topic in sorted(pinned_df["topic"].unique()):
+                rerun()
+            pinned_by_topic = kb_index.pinned_by_topic(st.session_state["pinned_keywords"])
+            for topic, pinned_kws in pinned_by_topic.items():
                 with st.expander(f"📁 {topic}", expanded=False):
-                    for kw in sorted(pinned_df[pinned_df["topic"] == topic]["key word"].unique()):
+                    for kw in pinned_kws:
                         if st.button(f"📍 {kw}", key=f"pinned-{kw}"):
                             set_selected_keyword(kw)
-                            st.rerun()
+                            rerun()
 
         st.markdown("### 🧠 Chọn nhiều từ khóa")
-        filtered_keywords = data[data["topic"].isin(selected_topics)]["key word"].unique() if selected_topics else all_keywords
-        selected_multi = st.multiselect("Chọn nhiều từ khóa:", sorted(filtered_keywords))
+        filtered_keywords = kb_index.keywords_for_topics(selected_topics)
+        selected_multi = st.multiselect("Chọn nhiều từ khóa:", filtered_keywords)
+        for kw in selected_multi:
+            if kw not in st.session_state["multi_filter_keywords"]:
+                service.record_selection(kw)
         st.session_state["multi_filter_keywords"] = selected_multi
 
+        perf_rerun.phase("catalog")
         st.markdown("### 📚 Danh mục từ khóa")
-        topics_to_show = selected_topics if selected_topics else all_topics
-        for topic in topics_to_show:
-            with st.expander(f"📁 {topic}", expanded=False):
-                topic_data = data[data["topic"] == topic]
-                topic_keywords = sorted(topic_data["key word"].dropna().astype(str).unique())
-                for kw in topic_keywords:
-                    cols = st.columns([0.8, 0.2])
-                    if cols[0].button(f"🔑 {kw}", key=f"kw-{topic}-{kw}"):
-                        set_selected_keyword(kw)
-                        st.session_state["trigger_display"] = True  # Đảm bảo bật hiển thị lại
-                        st.rerun()
-                    pin_icon = "📌" if kw in st.session_state["pinned_keywords"] else "☆"
-                    if cols[1].button(pin_icon, key=f"pin-{topic}-{kw}"):
-                        if kw in st.session_state["pinned_keywords"]:
-                            st.session_state["pinned_keywords"].remove(kw)
-                        else:
-                            st.session_state["pinned_keywords"].insert(0, kw)
-                        save_pinned_keywords(st.session_state["pinned_keywords"])
+        topics_to_show = selected_topics or suggested_topics + [t for t in all_topics if t not in suggested_topics]
+        # Chỉ dựng nút cho chủ đề đang mở, và chỉ một trang từ khóa mỗi lần
+        open_topic = st.selectbox(
+            "📂 Mở chủ đề:",
+            topics_to_show,
+            index=None,
+            placeholder="Chọn chủ đề để xem từ khóa",
+            key="catalog_topic"
+        )
+        popular_first = st.checkbox("🔥 Xếp từ khóa hay dùng lên trước", key="catalog_popular_first")
+        if open_topic:
+            topic_keywords = kb_index.keywords_for_topic(open_topic)
+            if popular_first:
+                topic_keywords = service.rank_by_popularity(topic_keywords)
+            n_pages = max((len(topic_keywords) - 1) // CATALOG_PAGE_SIZE + 1, 1)
+            page = 1
+            if n_pages > 1:
+                page = st.number_input(
+                    f"Trang (1-{n_pages})", min_value=1, max_value=n_pages, value=1, step=1,
+                    key=f"catalog_page-{open_topic}"
+                )
+            start = (page - 1) * CATALOG_PAGE_SIZE
+            for kw in topic_keywords[start:start + CATALOG_PAGE_SIZE]:
+                cols = st.columns([0.8, 0.2])
+                if cols[0].button(f"🔑 {kw}", key=f"kw-{open_topic}-{kw}"):
+                    set_selected_keyword(kw)
+                    st.session_state["trigger_display"] = True  # Đảm bảo bật hiển thị lại
+                    rerun()
+                pin_icon = "📌" if kw in st.session_state["pinned_keywords"] else "☆"
+                if cols[1].button(pin_icon, key=f"pin-{open_topic}-{kw}"):
+                    if kw in st.session_state["pinned_keywords"]:
+                        st.session_state["pinned_keywords"].remove(kw)
+                    else:
+                        st.session_state["pinned_keywords"].insert(0, kw)
+                    save_pinned_keywords(st.session_state["pinned_keywords"])
 
+    perf_rerun.phase("searchbox")
     def search_fn(user_input):
-        return [kw for kw in all_keywords if user_input.lower() in kw.lower()]
+        return service.search(user_input, popular=True)
 
     selected_keyword = st_searchbox(
         search_fn,
+        default_options=service.popular_keywords(POPULAR_SUGGESTIONS),
         key="keyword_search",
         label="🔍 Gõ từ khóa để tìm nhanh",
         placeholder="Ví dụ: học phí, học bổng..."
     )
-    if selected_keyword:
+    # Chỉ coi là lựa chọn mới khi giá trị searchbox thay đổi
+    if selected_keyword and selected_keyword != st.session_state.get("last_searchbox_value"):
         set_selected_keyword(selected_keyword)
+    st.session_state["last_searchbox_value"] = selected_keyword
 
+    perf_rerun.phase("question")
+    question = st.text_input(
+        "💬 Nhập câu hỏi của người gọi",
+        placeholder="Ví dụ: học phí một năm là bao nhiêu?",
+        key="free_text_question"
+    )
+    if question:
+        answers = service.ask(question)
+        if answers:
+            st.subheader("🤖 Câu trả lời gợi ý:")
+            for answer in answers:
+                kw, topic = answer["keyword"], answer["topic"]
+                display_bot_response(kw, answer["description"], topic, event=("question", question, kw, topic))
+        else:
+            st.info("⚠️ Không tìm thấy câu trả lời phù hợp cho câu hỏi này.")
+
+    perf_rerun.phase("render")
     if st.session_state["multi_filter_keywords"]:
         st.subheader("📋 Kết quả theo nhiều từ khóa:")
-        for kw in st.session_state["multi_filter_keywords"]:
-            matches = data[data["key word"].str.lower() == kw.lower()]
-            for _, row in matches.iterrows():
-                display_bot_response(kw, row["description"], row["topic"])
+        for kw, matches in service.lookup_many(st.session_state["multi_filter_keywords"]).items():
+            for answer in matches:
+                topic = answer["topic"]
+                display_bot_response(kw, answer["description"], topic, event=("multi", kw, topic))
     elif st.session_state["selected_keyword"] and st.session_state["trigger_display"]:
         st.session_state["trigger_display"] = False
         kw = st.session_state["selected_keyword"]
-        matches = data[data["key word"].str.lower() == kw.lower()]
-        if not matches.empty:
-            for _, row in matches.iterrows():
-                display_bot_response(kw, row["description"], row["topic"])
+        matches = service.lookup(kw)
+        if matches:
+            for answer in matches:
+                topic = answer["topic"]
+                display_bot_response(kw, answer["description"], topic, event=("keyword", st.session_state["selection_seq"], topic))
         else:
             st.info("⚠️ Không tìm thấy mô tả cho từ khóa này.")
 else:
     st.error("⚠️ Không tìm thấy dữ liệu hợp lệ.")
 
-# === Hiển thị lịch sử hội thoại (ẩn mặc định và có nút xóa) ===
-if st.session_state["chat_history"]:
+perf_rerun.phase("history")
+st.session_state["chat_history"].end_rerun()
+
+# === Hiển thị lịch sử hội thoại (ẩn mặc định, có nút xóa và phân trang) ===
+chat_history = st.session_state["chat_history"]
+if chat_history:
     st.markdown("---")
     with st.expander("💬 Xem lại lịch sử cuộc trò chuyện", expanded=False):
         if st.button("🗑️ Xóa lịch sử cuộc trò chuyện"):
-            st.session_state["chat_history"] = []
-            st.rerun()
-        for msg in st.session_state["chat_history"]:
+            chat_history.clear()
+            rerun()
+        n_pages = chat_history.n_pages(HISTORY_PAGE_SIZE)
+        history_page = 1
+        if n_pages > 1:
+            history_page = st.number_input(
+                f"Trang (1-{n_pages}, mới nhất trước)", min_value=1, max_value=n_pages, value=1, step=1,
+                key="history_page"
+            )
+        for msg in chat_history.page(history_page, HISTORY_PAGE_SIZE):
             st.chat_message("user").markdown(f"🔍 **Từ khóa:** {msg['keyword']}")
-            st.chat_message("assistant").markdown(f"**📂 Chủ đề:** {msg['topic']}\\n\\n{msg['description']}")
+            st.chat_message("assistant").markdown(f"**📂 Chủ đề:** {msg['topic']}\n\n{msg['description']}")
+
+perf_rerun.end()
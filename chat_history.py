@@ -0,0 +1,73 @@
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from itertools import islice
+
+HISTORY_LIMIT = 200
+HISTORY_PAGE_SIZE = 10
+
+
+# === Ghi lịch sử ra file JSON lines (tuỳ chọn) ===
+class JsonlHistorySink:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, user_id, entry):
+        line = json.dumps({"user_id": user_id, **entry}, ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# === Lịch sử hội thoại có giới hạn (ring buffer) cho mỗi phiên ===
+class ChatHistory:
+    def __init__(self, user_id, maxlen=HISTORY_LIMIT, sink=None):
+        self.user_id = user_id
+        self.sink = sink
+        self._entries = deque(maxlen=maxlen)
+        # Sự kiện trả lời đã hiển thị ở lần rerun trước / lần hiện tại
+        self._shown = set()
+        self._shown_now = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    # === Ghi một lần cho mỗi sự kiện: câu trả lời vẫn hiển thị qua nhiều rerun thì không ghi lại ===
+    def record(self, keyword, description, topic, event=None):
+        if event is not None:
+            seen = event in self._shown or event in self._shown_now
+            self._shown_now.add(event)
+            if seen:
+                return False
+        entry = {
+            "keyword": keyword,
+            "description": description,
+            "topic": topic,
+            "time": datetime.now().isoformat(timespec="seconds")
+        }
+        self._entries.append(entry)
+        if self.sink is not None:
+            try:
+                self.sink(self.user_id, entry)
+            except OSError:
+                # Không ghi được file log thì vẫn giữ lịch sử trong phiên
+                pass
+        return True
+
+    def end_rerun(self):
+        self._shown, self._shown_now = self._shown_now, set()
+
+    def clear(self):
+        self._entries.clear()
+
+    def n_pages(self, page_size=HISTORY_PAGE_SIZE):
+        return max((len(self._entries) - 1) // page_size + 1, 1)
+
+    # === Trang `page` (bắt đầu từ 1), mới nhất trước ===
+    def page(self, page, page_size=HISTORY_PAGE_SIZE):
+        start = (page - 1) * page_size
+        return list(islice(reversed(self._entries), start, start + page_size))
@@ -0,0 +1,162 @@
+import hashlib
+import threading
+import unicodedata
+import zlib
+
+import numpy as np
+
+from kb_index import is_missing
+
+NULL_HASH = "-"             # mọi mô tả trống coi như trùng nhau (giống drop_duplicates)
+NUM_PERM = 64
+LSH_BANDS = 16              # 16 band x 4 hàng: cặp có Jaccard 0.7 được so sánh với xác suất ~99%
+NEAR_DUPLICATE_THRESHOLD = 0.7
+SIGNATURE_BATCH = 256
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+# === Băm nội dung mô tả để loại trùng chính xác: O(1) mỗi dòng ===
+def content_hash(text):
+    if is_missing(text):
+        return NULL_HASH
+    # Bỏ khác biệt không nhìn thấy được: dạng Unicode, khoảng trắng thừa
+    normalized = " ".join(unicodedata.normalize("NFC", str(text)).split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# === MinHash trên các cặp âm tiết liền nhau của mô tả ===
+class MinHasher:
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        # Họ hàm băm multiply-shift: (a * x + b) >> 32, a lẻ
+        self.a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+
+    # Chữ ký được lưu vào snapshot nên không dùng hash() của Python (đổi theo từng process)
+    def shingles(self, text):
+        words = unicodedata.normalize("NFC", str(text)).lower().split()
+        pairs = [f"{a} {b}" for a, b in zip(words, words[1:])] or [" ".join(words)]
+        shingles = {zlib.crc32(pair.encode("utf-8")) for pair in pairs}
+        return np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+
+    def signature(self, text):
+        return self.signatures([text])[0]
+
+    # === Tính chữ ký cho nhiều mô tả một lượt (vector hoá theo lô) ===
+    def signatures(self, texts, batch_size=SIGNATURE_BATCH):
+        result = []
+        for start in range(0, len(texts), batch_size):
+            shingles = [self.shingles(text) for text in texts[start:start + batch_size]]
+            offsets = np.cumsum([0] + [len(values) for values in shingles[:-1]])
+            values = np.concatenate(shingles)
+            with np.errstate(over="ignore"):
+                hashed = (self.a[:, None] * values[None, :] + self.b[:, None]) & _MASK64
+            minimums = np.minimum.reduceat(hashed >> np.uint64(32), offsets, axis=1)
+            result.extend(minimums.T.astype(np.uint32))
+        return result
+
+
+# === Chỉ mục LSH tăng dần: chỉ băm mô tả mới, báo các cặp mô tả gần trùng ===
+class NearDuplicateIndex:
+    def __init__(self, threshold=NEAR_DUPLICATE_THRESHOLD, num_perm=NUM_PERM, bands=LSH_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._signatures = {}   # content hash -> chữ ký MinHash
+        self._rows = {}         # content hash -> [(keyword, description, topic)]
+        self._buckets = [{} for _ in range(bands)]
+        self._pairs = {}        # (hash, hash) -> độ tương đồng ước lượng
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._signatures)
+
+    # === Lưu snapshot: chữ ký gom thành một ma trận (mmap được), bucket LSH dựng lại khi cần ===
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"], state["_buckets"]
+        hashes = list(self._signatures)
+        matrix = np.stack([self._signatures[h] for h in hashes]) if hashes else np.empty((0, 0), np.uint32)
+        state["_signatures"] = (hashes, matrix)
+        return state
+
+    def __setstate__(self, state):
+        hashes, matrix = state.pop("_signatures")
+        self.__dict__.update(state)
+        self._signatures = dict(zip(hashes, matrix))
+        self._buckets = None
+        self._lock = threading.Lock()
+
+    def _ensure_buckets(self):
+        if self._buckets is not None:
+            return
+        self._buckets = [{} for _ in range(self.bands)]
+        for h, signature in self._signatures.items():
+            for band, key in zip(self._buckets, self._band_keys(signature)):
+                band.setdefault(key, set()).add(h)
+
+    def _band_keys(self, signature):
+        return [band.tobytes() for band in signature.reshape(self.bands, self.rows_per_band)]
+
+    def _add(self, h, signature):
+        candidates = set()
+        for band, key in zip(self._buckets, self._band_keys(signature)):
+            bucket = band.setdefault(key, set())
+            candidates.update(bucket)
+            bucket.add(h)
+        for other in candidates:
+            similarity = float(np.mean(signature == self._signatures[other]))
+            if similarity >= self.threshold:
+                self._pairs[(h, other) if h < other else (other, h)] = similarity
+        self._signatures[h] = signature
+
+    def _remove(self, h):
+        signature = self._signatures.pop(h)
+        for band, key in zip(self._buckets, self._band_keys(signature)):
+            bucket = band.get(key)
+            if bucket is not None:
+                bucket.discard(h)
+                if not bucket:
+                    del band[key]
+        for pair in [pair for pair in self._pairs if h in pair]:
+            del self._pairs[pair]
+
+    # === Đồng bộ với dữ liệu hiện tại: mô tả trùng chính xác dùng chung một chữ ký ===
+    def sync(self, records):
+        rows = {}
+        for keyword, description, topic in records:
+            h = content_hash(description)
+            if h != NULL_HASH:
+                rows.setdefault(h, []).append((keyword, description, topic))
+        with self._lock:
+            new = [h for h in rows if h not in self._signatures]
+            removed = [h for h in self._signatures if h not in rows]
+            if new or removed:
+                self._ensure_buckets()
+            for h in removed:
+                self._remove(h)
+            signatures = self.hasher.signatures([rows[h][0][1] for h in new])
+            for h, signature in zip(new, signatures):
+                self._add(h, signature)
+            self._rows = rows
+
+    # === Các cặp gần trùng (không tính trùng chính xác), giống nhất trước ===
+    def pairs(self):
+        with self._lock:
+            items = sorted(self._pairs.items(), key=lambda item: item[1], reverse=True)
+            rows = self._rows
+        result = []
+        for (h1, h2), similarity in items:
+            (kw_a, desc_a, topic_a), (kw_b, desc_b, topic_b) = rows[h1][0], rows[h2][0]
+            result.append({
+                "similarity": round(similarity, 2),
+                "keyword_a": kw_a,
+                "topic_a": topic_a,
+                "keyword_b": kw_b,
+                "topic_b": topic_b,
+                "description_a": desc_a,
+                "description_b": desc_b
+            })
+        return result
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from kb_index import KB_COLUMNS
+
+MANIFEST_NAME = "manifest.json"
+
+
+# === Ghi file an toàn: ghi ra file tạm rồi thay thế (tên tạm riêng cho mỗi process/thread) ===
+def _atomic_write(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# === Tải CSV từ GitHub: song song, có điều kiện (ETag/sha) và lưu đệm trên đĩa ===
+class GitHubCsvSource:
+    def __init__(self, api_url, cache_dir, max_workers=8, timeout=10, token=None):
+        self.api_url = api_url
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.token = token or os.environ.get("GITHUB_TOKEN")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._session = None
+        self._lock = threading.Lock()
+        self._manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+
+    # requests chỉ được import khi thật sự gọi GitHub (khởi động từ snapshot thì chưa cần)
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            if self.token:
+                session.headers["Authorization"] = f"Bearer {self.token}"
+            self._session = session
+        return self._session
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"listing_etag": None, "listing": [], "files": {}}
+
+    def _save_manifest(self):
+        _atomic_write(self._manifest_path, json.dumps(self.manifest, ensure_ascii=False))
+
+    def _cached_path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    # === Danh sách file CSV: gửi If-None-Match, 304 thì dùng lại danh sách cũ ===
+    def list_csv_files(self):
+        headers = {}
+        if self.manifest.get("listing_etag"):
+            headers["If-None-Match"] = self.manifest["listing_etag"]
+        response = self.session.get(self.api_url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return self.manifest["listing"]
+        response.raise_for_status()
+        listing = sorted(
+            [
+                {"name": f["name"], "sha": f.get("sha"), "download_url": f["download_url"]}
+                for f in response.json() if f["name"].endswith(".csv")
+            ],
+            key=lambda f: f["name"]
+        )
+        self.manifest["listing_etag"] = response.headers.get("ETag")
+        self.manifest["listing"] = listing
+        return listing
+
+    def _is_fresh(self, entry):
+        cached = self.manifest["files"].get(entry["name"])
+        return (
+            cached is not None
+            and entry.get("sha") is not None
+            and cached.get("sha") == entry["sha"]
+            and os.path.exists(self._cached_path(entry["name"]))
+        )
+
+    def _download(self, entry):
+        name = entry["name"]
+        cached = self.manifest["files"].get(name, {})
+        headers = {}
+        if cached.get("etag") and os.path.exists(self._cached_path(name)):
+            headers["If-None-Match"] = cached["etag"]
+        response = self.session.get(entry["download_url"], headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return name, {**cached, "sha": entry.get("sha")}
+        response.raise_for_status()
+        _atomic_write(self._cached_path(name), response.content)
+        return name, {"sha": entry.get("sha"), "etag": response.headers.get("ETag")}
+
+    # === Đồng bộ: chỉ tải các file đã thay đổi, trả về danh sách lỗi (nếu có) ===
+    def refresh(self):
+        # Webhook, hỏi định kỳ và lần tải lúc khởi động có thể chạy cùng lúc: mỗi lúc chỉ một lượt sửa manifest
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self):
+        errors = []
+        try:
+            listing = self.list_csv_files()
+        except Exception as e:
+            # API chậm / bị giới hạn / lỗi: phục vụ bản đã lưu gần nhất
+            errors.append(f"Lỗi khi lấy danh sách file từ GitHub: {e}")
+            return errors
+
+        stale = [entry for entry in listing if not self._is_fresh(entry)]
+        if stale:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {entry["name"]: pool.submit(self._download, entry) for entry in stale}
+            for name, future in futures.items():
+                try:
+                    name, meta = future.result()
+                    self.manifest["files"][name] = meta
+                except Exception as e:
+                    errors.append(f"Không thể đọc {name} từ GitHub: {e}")
+        self._save_manifest()
+        return errors
+
+    # === Mã phiên bản: thay đổi khi bất kỳ file nào thay đổi ===
+    @property
+    def snapshot_id(self):
+        digest = hashlib.sha1()
+        for entry in self.manifest.get("listing", []):
+            meta = self.manifest["files"].get(entry["name"], {})
+            digest.update(f"{entry['name']}:{meta.get('sha') or meta.get('etag')}\n".encode())
+        return digest.hexdigest()
+
+    # === Đọc các file đã lưu và gộp một lần ===
+    def load_dataframe(self):
+        import pandas as pd
+        frames = []
+        errors = []
+        for entry in self.manifest.get("listing", []):
+            name = entry["name"]
+            path = self._cached_path(name)
+            if not os.path.exists(path):
+                continue
+            try:
+                df = pd.read_csv(path)
+                df.columns = df.columns.str.lower().str.strip()
+                if {"key word", "description"}.issubset(df.columns):
+                    df["topic"] = name.replace(".csv", "")
+                    frames.append(df[KB_COLUMNS])
+            except Exception as e:
+                errors.append(f"Không thể đọc {name} từ bộ nhớ đệm: {e}")
+        if not frames:
+            return pd.DataFrame(columns=KB_COLUMNS), errors
+        return pd.concat(frames, ignore_index=True), errors
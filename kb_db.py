@@ -0,0 +1,359 @@
+import os
+import sqlite3
+import threading
+
+from dedup import content_hash
+from kb_index import KB_COLUMNS, is_missing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+
+CREATE TABLE IF NOT EXISTS keywords (
+    id INTEGER PRIMARY KEY,
+    keyword TEXT NOT NULL,
+    description TEXT,
+    topic TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    content_hash TEXT NOT NULL DEFAULT '',
+    latest INTEGER NOT NULL DEFAULT 1,
+    visible INTEGER NOT NULL DEFAULT 1,
+    UNIQUE (keyword, topic)
+);
+CREATE INDEX IF NOT EXISTS idx_keywords_topic ON keywords (topic);
+CREATE INDEX IF NOT EXISTS idx_keywords_seq ON keywords (seq);
+"""
+
+# Cột cho loại trùng, thêm vào cơ sở dữ liệu tạo từ phiên bản cũ
+DEDUPE_COLUMNS = {
+    "content_hash": "TEXT NOT NULL DEFAULT ''",
+    "latest": "INTEGER NOT NULL DEFAULT 1",
+    "visible": "INTEGER NOT NULL DEFAULT 1",
+}
+DEDUPE_INDEX = "CREATE INDEX IF NOT EXISTS idx_keywords_hash ON keywords (content_hash)"
+
+# Ghi lại từ khóa / nội dung bị ảnh hưởng trong giao dịch (bảng tạm riêng cho mỗi kết nối).
+# Không dùng khoá duy nhất: trong trigger, INSERT OR IGNORE bị ON CONFLICT của câu upsert ghi đè.
+DIRTY_TABLES = """
+CREATE TEMP TABLE IF NOT EXISTS dirty_keywords (keyword TEXT);
+CREATE TEMP TABLE IF NOT EXISTS dirty_hashes (content_hash TEXT);
+CREATE TEMP TABLE IF NOT EXISTS staged_rows (
+    source INTEGER NOT NULL, keyword TEXT NOT NULL, description TEXT, topic TEXT NOT NULL, content_hash TEXT NOT NULL
+);
+"""
+DIRTY_TRIGGERS = """
+CREATE TEMP TRIGGER IF NOT EXISTS dirty_ai AFTER INSERT ON main.keywords BEGIN
+    INSERT INTO dirty_keywords VALUES (new.keyword);
+    INSERT INTO dirty_hashes VALUES (new.content_hash);
+END;
+CREATE TEMP TRIGGER IF NOT EXISTS dirty_ad AFTER DELETE ON main.keywords BEGIN
+    INSERT INTO dirty_keywords VALUES (old.keyword);
+    INSERT INTO dirty_hashes VALUES (old.content_hash);
+END;
+CREATE TEMP TRIGGER IF NOT EXISTS dirty_au AFTER UPDATE OF keyword, seq, content_hash ON main.keywords BEGIN
+    INSERT INTO dirty_keywords VALUES (old.keyword), (new.keyword);
+    INSERT INTO dirty_hashes VALUES (old.content_hash), (new.content_hash);
+END;
+"""
+
+# Giống drop_duplicates(subset="key word", keep="last") rồi drop_duplicates(subset="description", keep="first")
+# theo thứ tự (seq, id), nhưng chỉ tính lại cho các từ khóa / nội dung vừa thay đổi
+REFRESH_LATEST_SQL = """
+UPDATE keywords SET latest = (id = (
+    SELECT k.id FROM keywords k WHERE k.keyword = keywords.keyword ORDER BY k.seq DESC, k.id DESC LIMIT 1
+)) WHERE keyword IN (SELECT keyword FROM temp.dirty_keywords)
+"""
+REFRESH_VISIBLE_SQL = """
+UPDATE keywords SET visible = latest AND id = (
+    SELECT k.id FROM keywords k WHERE k.content_hash = keywords.content_hash AND k.latest ORDER BY k.seq, k.id LIMIT 1
+) WHERE content_hash IN (SELECT content_hash FROM temp.dirty_hashes)
+"""
+
+# Bảng FTS5 cũ không còn dùng (tìm kiếm chạy trên chỉ mục trong bộ nhớ, xem search.py):
+# bỏ trigger trước để mỗi lần ghi không phải cập nhật bảng này nữa
+DROP_FTS = """
+DROP TRIGGER IF EXISTS keywords_ai;
+DROP TRIGGER IF EXISTS keywords_ad;
+DROP TRIGGER IF EXISTS keywords_au;
+DROP TABLE IF EXISTS keywords_fts;
+"""
+
+# Chép các dòng tải lên đã chuẩn bị sẵn sang bảng chính, theo thứ tự đọc (dòng sau ghi đè dòng trước)
+COPY_STAGED_SQL = """
+INSERT INTO keywords (keyword, description, topic, seq, content_hash)
+SELECT keyword, description, topic, ?, content_hash FROM temp.staged_rows WHERE true ORDER BY rowid
+ON CONFLICT (keyword, topic) DO UPDATE SET
+    description = excluded.description, seq = excluded.seq, content_hash = excluded.content_hash
+"""
+
+UPSERT_SQL = """
+INSERT INTO keywords (keyword, description, topic, seq, content_hash) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (keyword, topic) DO UPDATE SET
+    description = excluded.description, seq = excluded.seq, content_hash = excluded.content_hash
+"""
+
+
+def _clean(value):
+    return None if is_missing(value) else str(value)
+
+
+# === Lưu trữ từ khóa bằng SQLite (WAL): ghi từng dòng, người đọc không bị chặn ===
+class KeywordDatabase:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._schema_ready = False
+        self.on_change = None       # gọi sau mỗi lần ghi thành công (báo cho cache/process khác)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self._drop_fts(conn)
+        conn.executescript(DIRTY_TABLES)
+        self._migrate_dedupe(conn)
+        conn.executescript(DIRTY_TRIGGERS)
+        self._schema_ready = True
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if self._schema_ready:
+                conn.executescript(DIRTY_TABLES + DIRTY_TRIGGERS)
+            self._local.conn = conn
+        return conn
+
+    # === Cơ sở dữ liệu cũ: bỏ bảng FTS5 và các trigger của nó ===
+    def _drop_fts(self, conn):
+        try:
+            conn.executescript(DROP_FTS)
+        except sqlite3.OperationalError:
+            # SQLite không có FTS5 thì không xoá được bảng ảo, nhưng trigger đã bỏ nên không ai ghi vào nữa
+            pass
+
+    # === Cơ sở dữ liệu cũ: thêm cột băm nội dung và tính cờ hiển thị một lần ===
+    def _migrate_dedupe(self, conn):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(keywords)")}
+            missing = [name for name in DEDUPE_COLUMNS if name not in columns]
+            for name in missing:
+                conn.execute(f"ALTER TABLE keywords ADD COLUMN {name} {DEDUPE_COLUMNS[name]}")
+            conn.execute(DEDUPE_INDEX)
+            if missing:
+                rows = conn.execute("SELECT id, description FROM keywords").fetchall()
+                conn.executemany(
+                    "UPDATE keywords SET content_hash = ? WHERE id = ?", [(content_hash(desc), i) for i, desc in rows]
+                )
+                conn.execute("INSERT INTO temp.dirty_keywords SELECT DISTINCT keyword FROM keywords")
+                self._refresh_visibility(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # === Tính lại cờ loại trùng cho phần vừa thay đổi (trong cùng giao dịch ghi) ===
+    def _refresh_visibility(self, conn):
+        conn.execute(REFRESH_LATEST_SQL)
+        # Từ khóa đổi dòng "mới nhất" thì các dòng cùng nội dung cũng phải tính lại
+        conn.execute(
+            "INSERT INTO temp.dirty_hashes "
+            "SELECT content_hash FROM keywords WHERE keyword IN (SELECT keyword FROM temp.dirty_keywords)"
+        )
+        conn.execute(REFRESH_VISIBLE_SQL)
+        conn.execute("DELETE FROM temp.dirty_keywords")
+        conn.execute("DELETE FROM temp.dirty_hashes")
+
+    # === Giao dịch ghi: tăng version để các process khác biết dữ liệu đã đổi ===
+    def _write(self, fn):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            seq = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+            result = fn(conn, seq)
+            self._refresh_visibility(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if self.on_change is not None:
+            self.on_change()
+        return result
+
+    def version(self):
+        return self._connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def has_data(self):
+        return self._connect().execute("SELECT EXISTS (SELECT 1 FROM keywords)").fetchone()[0] == 1
+
+    def topics(self):
+        rows = self._connect().execute("SELECT DISTINCT topic FROM keywords ORDER BY topic")
+        return [topic for (topic,) in rows]
+
+    def to_dataframe(self):
+        import pandas as pd
+        rows = self._connect().execute("SELECT keyword, description, topic FROM keywords ORDER BY seq, id").fetchall()
+        return pd.DataFrame(rows, columns=KB_COLUMNS)
+
+    # === Dữ liệu đã loại trùng: cờ hiển thị được tính sẵn khi ghi, đọc ra không phải so sánh gì ===
+    def deduped_rows(self):
+        return self._connect().execute(
+            "SELECT keyword, description, topic FROM keywords WHERE visible ORDER BY seq, id"
+        ).fetchall()
+
+    def topic_dataframe(self, topic):
+        import pandas as pd
+        rows = self._connect().execute(
+            "SELECT keyword, description, topic FROM keywords WHERE topic = ? ORDER BY seq, id", (topic,)
+        ).fetchall()
+        return pd.DataFrame(rows, columns=KB_COLUMNS)
+
+    # === Các topic đang chứa mỗi từ khóa (dùng cho hash join khi tải file lên) ===
+    # Tính cả các dòng đã đọc từ những file trước trong cùng lượt tải lên (chưa chép sang bảng chính)
+    def topics_for_keywords(self, keywords):
+        keywords = list(keywords)
+        conn = self._connect()
+        result = {}
+        for start in range(0, len(keywords), 500):
+            part = keywords[start:start + 500]
+            marks = ",".join("?" * len(part))
+            rows = conn.execute(
+                f"SELECT keyword, topic FROM keywords WHERE keyword IN ({marks}) "
+                f"UNION SELECT keyword, topic FROM temp.staged_rows WHERE keyword IN ({marks})",
+                part + part
+            )
+            for kw, topic in rows:
+                result.setdefault(kw, []).append(topic)
+        return result
+
+    def upsert(self, keyword, description, topic):
+        self.upsert_many([(keyword, description, topic)])
+
+    def upsert_many(self, rows):
+        rows = [
+            (_clean(kw), _clean(desc), _clean(topic))
+            for kw, desc, topic in rows
+            if _clean(kw) and _clean(topic)
+        ]
+        if not rows:
+            return 0
+
+        def fn(conn, seq):
+            conn.executemany(UPSERT_SQL, [(kw, desc, topic, seq, content_hash(desc)) for kw, desc, topic in rows])
+            return len(rows)
+        return self._write(fn)
+
+    # === Ghi nhiều nguồn (mỗi nguồn là các lô dòng) trong một giao dịch ===
+    # Đọc, chuẩn hoá các lô vào bảng tạm trước, không giữ khoá ghi (việc này mất vài chục giây với file lớn);
+    # chỉ khoá khi chép sang bảng chính. Nguồn nào lỗi giữa chừng thì chỉ bỏ phần của nguồn đó;
+    # trả về [(tên, số dòng, lỗi)]
+    def upsert_sources(self, sources):
+        conn = self._connect()
+        conn.execute("DELETE FROM temp.staged_rows")
+        results = []
+        try:
+            for source_id, (name, batches) in enumerate(sources):
+                count = 0
+                try:
+                    for rows in batches:
+                        rows = [
+                            (source_id, _clean(kw), _clean(desc), _clean(topic), content_hash(desc))
+                            for kw, desc, topic in rows
+                            if _clean(kw) and _clean(topic)
+                        ]
+                        conn.execute("BEGIN")
+                        conn.executemany("INSERT INTO temp.staged_rows VALUES (?, ?, ?, ?, ?)", rows)
+                        conn.execute("COMMIT")
+                        count += len(rows)
+                except Exception as e:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    conn.execute("DELETE FROM temp.staged_rows WHERE source = ?", (source_id,))
+                    results.append((name, 0, e))
+                else:
+                    results.append((name, count, None))
+            if any(count for _, count, _ in results):
+                self._write(lambda conn, seq: conn.execute(COPY_STAGED_SQL, (seq,)))
+        finally:
+            conn.execute("DELETE FROM temp.staged_rows")
+        return results
+
+    def delete(self, topic, keywords):
+        keywords = list(keywords)
+
+        def fn(conn, seq):
+            cur = conn.executemany(
+                "DELETE FROM keywords WHERE topic = ? AND keyword = ?", [(topic, kw) for kw in keywords]
+            )
+            return cur.rowcount
+        return self._write(fn)
+
+    def delete_topic(self, topic):
+        return self._write(lambda conn, seq: conn.execute("DELETE FROM keywords WHERE topic = ?", (topic,)).rowcount)
+
+    def rename_topic(self, old_name, new_name):
+        # Cùng tên: câu DELETE bên dưới sẽ xoá sạch topic
+        if old_name == new_name:
+            return 0
+
+        def fn(conn, seq):
+            # Từ khóa đã có ở topic mới thì giữ bản của topic cũ (giống ghi đè)
+            conn.execute(
+                "DELETE FROM keywords WHERE topic = ? AND keyword IN (SELECT keyword FROM keywords WHERE topic = ?)",
+                (new_name, old_name)
+            )
+            return conn.execute("UPDATE keywords SET topic = ? WHERE topic = ?", (new_name, old_name)).rowcount
+        return self._write(fn)
+
+    # === Lưu bảng chỉnh sửa của một topic: chỉ ghi các dòng thực sự thay đổi ===
+    def replace_topic(self, topic, rows):
+        new_rows = {}
+        for kw, desc, row_topic in rows:
+            kw = _clean(kw)
+            if kw:
+                new_rows[(kw, _clean(row_topic) or topic)] = _clean(desc)
+
+        def fn(conn, seq):
+            old_rows = {
+                (kw, topic): desc
+                for kw, desc in conn.execute("SELECT keyword, description FROM keywords WHERE topic = ?", (topic,))
+            }
+            removed = [key for key in old_rows if key not in new_rows]
+            changed = [
+                (kw, desc, row_topic, seq, content_hash(desc))
+                for (kw, row_topic), desc in new_rows.items()
+                if old_rows.get((kw, row_topic), object()) != desc
+            ]
+            conn.executemany("DELETE FROM keywords WHERE keyword = ? AND topic = ?", removed)
+            conn.executemany(UPSERT_SQL, changed)
+            return len(removed) + len(changed)
+        return self._write(fn)
+
+    # === CSV chỉ còn là định dạng nhập/xuất ===
+    def import_csv(self, path_or_buffer, default_topic=None):
+        import pandas as pd
+        df = pd.read_csv(path_or_buffer)
+        df.columns = df.columns.str.lower().str.strip()
+        if not {"key word", "description"}.issubset(df.columns):
+            raise ValueError("Cần có cột 'key word' và 'description'.")
+        if "topic" not in df.columns:
+            df["topic"] = default_topic
+        return self.upsert_many(zip(df["key word"], df["description"], df["topic"]))
+
+    # === File CSV cũ chỉ nhập đúng một lần: đánh dấu trong meta, xoá hết topic rồi khởi động lại không nhập lại ===
+    def import_legacy_csv(self, path):
+        conn = self._connect()
+        if conn.execute("SELECT EXISTS (SELECT 1 FROM meta WHERE key = 'legacy_csv_imported')").fetchone()[0]:
+            return False
+        imported = not self.has_data() and os.path.exists(path)
+        if imported:
+            self.import_csv(path)
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('legacy_csv_imported', 1)")
+        return imported
+
+    def export_csv(self, path_or_buffer=None):
+        return self.to_dataframe().to_csv(path_or_buffer, index=False)
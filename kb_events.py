@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: không có khoá file, chỉ khoá trong process
+    fcntl = None
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    # Không có watchdog: kiểm tra thời điểm sửa file định kỳ (rẻ, không gọi mạng)
+    Observer = None
+
+POLL_INTERVAL = 2
+
+
+@contextmanager
+def _file_lock(path):
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# === Tem phiên bản trên ổ dùng chung: ghi khi dữ liệu đổi, các process khác được báo ngay ===
+class VersionStamp:
+    def __init__(self, path, poll_interval=POLL_INTERVAL):
+        self.path = os.path.abspath(path)
+        self.poll_interval = poll_interval
+        self._origin = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._watching = False
+        self._claims = {}   # vai trò -> file đang giữ khoá
+        self._last = self.read()
+
+    def read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"version": 0, "source": None}
+
+    # === Tăng version và ghi nguyên tử (file tạm + os.replace) ===
+    def bump(self, source):
+        with self._lock, _file_lock(self.path + ".lock"):
+            stamp = {
+                "version": self.read().get("version", 0) + 1,
+                "source": source,
+                "origin": self._origin,
+                "time": datetime.now().isoformat(timespec="seconds")
+            }
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(stamp, f)
+            os.replace(tmp, self.path)
+            self._last = stamp
+        return stamp
+
+    # === Chỉ một process giữ vai trò `name` (vd. hỏi GitHub định kỳ): khoá file không chờ, giữ tới khi process dừng ===
+    # Không có fcntl (Windows) thì process nào cũng nhận được
+    def claim(self, name):
+        with self._lock:
+            if name in self._claims:
+                return True
+            f = open(f"{self.path}.{name}.lock", "a")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    f.close()
+                    return False
+            self._claims[name] = f
+            return True
+
+    # callback(stamp) chạy trên thread theo dõi, chỉ khi process khác đổi tem
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+        self._start()
+
+    def _check(self):
+        stamp = self.read()
+        with self._lock:
+            if stamp.get("version") == self._last.get("version"):
+                return
+            self._last = stamp
+        if stamp.get("origin") == self._origin:
+            return
+        for callback in list(self._listeners):
+            try:
+                callback(stamp)
+            except Exception:
+                # Một listener lỗi không được làm dừng thread theo dõi
+                pass
+
+    def _start(self):
+        with self._lock:
+            if self._watching:
+                return
+            self._watching = True
+        if Observer is not None:
+            stamp = self
+
+            class Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    paths = {getattr(event, "src_path", None), getattr(event, "dest_path", None)}
+                    if stamp.path in paths:
+                        stamp._check()
+
+            observer = Observer()
+            observer.daemon = True
+            observer.schedule(Handler(), os.path.dirname(self.path))
+            observer.start()
+        else:
+            threading.Thread(target=self._poll, name="kb-stamp-poll", daemon=True).start()
+
+    def _poll(self):
+        last_mtime = None
+        while True:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime != last_mtime:
+                last_mtime = mtime
+                self._check()
+            time.sleep(self.poll_interval)
@@ -0,0 +1,97 @@
+import sys
+
+KB_COLUMNS = ["key word", "description", "topic"]
+
+
+# === Ô trống (None/NaN/NA) mà không phải import pandas: chưa import thì không thể có NA của pandas ===
+def is_missing(value):
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return False
+    pd = sys.modules.get("pandas")
+    if pd is not None:
+        return bool(pd.isna(value))
+    return value != value
+
+
+# === Chuẩn hoá từ khóa để tra cứu ===
+def normalize_keyword(keyword):
+    return str(keyword).strip().lower()
+
+
+# === Chỉ mục kho dữ liệu: dựng một lần cho mỗi phiên bản dữ liệu ===
+class KnowledgeBaseIndex:
+    def __init__(self, records):
+        # records: iterable of (keyword, description, topic)
+        self._rows_by_keyword = {}
+        self._topics_by_keyword = {}
+        topic_sets = {}
+        keywords = set()
+
+        for keyword, description, topic in records:
+            if is_missing(keyword):
+                continue
+            keyword = str(keyword)
+            row = (keyword, description, topic)
+            self._rows_by_keyword.setdefault(normalize_keyword(keyword), []).append(row)
+            keywords.add(keyword)
+            if is_missing(topic):
+                continue
+            topic_sets.setdefault(topic, set()).add(keyword)
+            self._topics_by_keyword.setdefault(keyword, set()).add(topic)
+
+        self.all_keywords = sorted(keywords)
+        self.all_topics = sorted(topic_sets)
+        self._keywords_by_topic = {
+            topic: sorted(kws) for topic, kws in topic_sets.items()
+        }
+
+    @classmethod
+    def from_dataframe(cls, df):
+        if df.empty or not set(KB_COLUMNS).issubset(df.columns):
+            return cls([])
+        return cls(zip(df["key word"], df["description"], df["topic"]))
+
+    def __len__(self):
+        return sum(len(rows) for rows in self._rows_by_keyword.values())
+
+    @property
+    def empty(self):
+        return not self._rows_by_keyword
+
+    def iter_rows(self):
+        for rows in self._rows_by_keyword.values():
+            yield from rows
+
+    # === Tra cứu theo từ khóa: O(1) ===
+    def lookup(self, keyword):
+        return self._rows_by_keyword.get(normalize_keyword(keyword), [])
+
+    # === Tra cứu nhiều từ khóa: O(k) ===
+    def lookup_many(self, keywords):
+        return [(kw, self.lookup(kw)) for kw in keywords]
+
+    def topics_for_keyword(self, keyword):
+        return self._topics_by_keyword.get(keyword, set())
+
+    def keywords_for_topic(self, topic):
+        return self._keywords_by_topic.get(topic, [])
+
+    def keywords_for_topics(self, topics):
+        if not topics:
+            return self.all_keywords
+        if len(topics) == 1:
+            return self.keywords_for_topic(topics[0])
+        merged = set()
+        for topic in topics:
+            merged.update(self._keywords_by_topic.get(topic, ()))
+        return sorted(merged)
+
+    # === Gom từ khóa đã ghim theo chủ đề: O(số từ khóa ghim) ===
+    def pinned_by_topic(self, pinned):
+        grouped = {}
+        for kw in pinned:
+            for topic in self._topics_by_keyword.get(kw, ()):
+                grouped.setdefault(topic, set()).add(kw)
+        return {topic: sorted(grouped[topic]) for topic in sorted(grouped)}
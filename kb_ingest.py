@@ -0,0 +1,84 @@
+from kb_index import KB_COLUMNS, is_missing
+
+INGEST_CHUNK_ROWS = 5000
+DEFAULT_UPLOAD_TOPIC = "Tải lên"
+
+# Chế độ tải lên
+UPDATE_EXISTING = "update_existing"     # giữ topic cũ của từ khóa đã có
+NEW_TOPIC = "new_topic"                 # cả file thành một topic mới
+
+
+class IngestError(ValueError):
+    pass
+
+
+# === Đọc CSV theo từng lô, chuẩn hoá tên cột ngay khi đọc ===
+def read_csv_chunks(file, chunk_rows=INGEST_CHUNK_ROWS):
+    import pandas as pd
+    # dtype=str: giữ nguyên từ khóa dạng số (vd "0123") thay vì đổi thành số
+    with pd.read_csv(file, chunksize=chunk_rows, dtype=str) as reader:
+        for chunk in reader:
+            chunk.columns = chunk.columns.str.lower().str.strip()
+            if not {"key word", "description"}.issubset(chunk.columns):
+                raise IngestError("Cần có cột 'key word' và 'description'.")
+            if "topic" not in chunk.columns:
+                chunk["topic"] = None
+            yield chunk[KB_COLUMNS]
+
+
+def _progress_of(file):
+    # Vị trí đọc trong file (0..1), nếu biết kích thước
+    size = getattr(file, "size", None)
+    try:
+        return min(file.tell() / size, 1.0) if size else 0.0
+    except (AttributeError, OSError, ValueError):
+        return 0.0
+
+
+# === Nạp nhiều file tải lên: đọc theo lô, hash join topic theo từ khóa, ghi một giao dịch ===
+class UploadIngestor:
+    def __init__(self, db, chunk_rows=INGEST_CHUNK_ROWS):
+        self.db = db
+        self.chunk_rows = chunk_rows
+
+    # Giống pd.merge(how="left") với dữ liệu cũ: topic trong file được ưu tiên,
+    # không có thì lấy mọi topic cũ của từ khóa, vẫn không có thì dùng topic mặc định
+    def _resolve_topics(self, chunk):
+        missing = chunk.loc[chunk["topic"].isna(), "key word"].dropna().unique()
+        old_topics = self.db.topics_for_keywords(missing) if len(missing) else {}
+        for kw, desc, topic in chunk.itertuples(index=False, name=None):
+            if not is_missing(topic):
+                yield kw, desc, topic
+                continue
+            for old_topic in old_topics.get(kw) or [DEFAULT_UPLOAD_TOPIC]:
+                yield kw, desc, old_topic
+
+    def _batches(self, file, mode, topic, on_progress):
+        rows_done = 0
+        for chunk in read_csv_chunks(file, self.chunk_rows):
+            if mode == NEW_TOPIC:
+                chunk = chunk.assign(topic=topic)
+                yield chunk.itertuples(index=False, name=None)
+            else:
+                yield self._resolve_topics(chunk)
+            rows_done += len(chunk)
+            on_progress(rows_done, _progress_of(file))
+
+    # files: các file-like có thuộc tính .name; topic_names: {tên file: topic} cho chế độ NEW_TOPIC
+    # progress(tỉ lệ 0..1, thông báo) được gọi sau mỗi lô; trả về [(tên file, số dòng, lỗi)]
+    def ingest(self, files, mode=UPDATE_EXISTING, topic_names=None, progress=None):
+        files = list(files)
+        topic_names = topic_names or {}
+
+        def sources():
+            for i, file in enumerate(files):
+                def on_progress(rows_done, fraction, i=i, file=file):
+                    if progress is not None:
+                        progress((i + fraction) / len(files), f"{file.name}: đã xử lý {rows_done:,} dòng")
+                yield file.name, self._batches(file, mode, topic_names.get(file.name), on_progress)
+                if progress is not None:
+                    progress((i + 1) / len(files), f"Đã xử lý {i + 1}/{len(files)} file")
+
+        if not files:
+            return []
+        return self.db.upsert_sources(sources())
@@ -0,0 +1,238 @@
+import os
+import threading
+import time
+
+from github_fetch import GitHubCsvSource
+from kb_db import KeywordDatabase
+from kb_events import VersionStamp
+from kb_snapshot import SNAPSHOT_FILE
+from kb_store import KnowledgeBaseStore
+from perf import span
+from popularity import AnswerCache, UsageTracker
+from search import fold_text
+
+# === GitHub Info ===
+GITHUB_USER = "mintus2511"
+GITHUB_REPO = "CC_Chatbot"
+GITHUB_API_URL = f"https://api.github.com/repos/{GITHUB_USER}/{GITHUB_REPO}/contents/"
+
+UPLOADED_FILE = "uploaded_keywords.csv"
+DB_FILE = "knowledge_base.db"
+GITHUB_CACHE_DIR = ".github_cache"
+STAMP_FILE = os.environ.get("KB_STAMP_FILE", "knowledge_base.stamp")
+REFRESH_RETRY_INTERVAL = 60     # lần tải GitHub bị lỗi thì thử lại ở nền sau 60 giây
+UPSTREAM_POLL_INTERVAL = 300    # dự phòng khi webhook không tới: hỏi GitHub có điều kiện (ETag), không đổi thì chỉ nhận 304
+POPULAR_POOL = 3                # lấy gấp 3 ứng viên khi tìm kiếm rồi xếp lại theo độ phổ biến
+
+
+def _answer(keyword, description, topic):
+    return {"keyword": keyword, "description": description, "topic": topic}
+
+
+# === Tra cứu / tìm kiếm / danh sách chủ đề, không phụ thuộc Streamlit ===
+class KnowledgeBaseService:
+    def __init__(self, store, stamp=None, usage=None):
+        self.store = store
+        self.stamp = stamp
+        self.usage = usage
+        self.answers = AnswerCache(weight=self._answer_weight if usage is not None else None)
+        self.refresh_errors = []
+        self._retry_timer = None
+        self._poll_lock = threading.Lock()
+        self._polling = False
+        store.db.on_change = self._on_local_change
+        if stamp is not None:
+            stamp.subscribe(self._on_stamp)
+
+    # Process này vừa ghi SQLite: bỏ cache của mình và báo cho các process khác
+    def _on_local_change(self):
+        self.store.invalidate()
+        if self.stamp is not None:
+            self.stamp.bump("local")
+
+    # Process khác vừa đổi dữ liệu; nếu là GitHub thì tải lại bản mới về cache của mình
+    def _on_stamp(self, stamp):
+        if stamp.get("source") == "github":
+            self.refresh()
+        else:
+            self.store.invalidate()
+
+    @property
+    def db(self):
+        return self.store.db
+
+    @property
+    def retriever(self):
+        return self.store.retriever
+
+    @property
+    def kb(self):
+        return self.store.current()
+
+    # Chờ bản mới nhất nếu đang dựng lại (admin vừa ghi thì thấy ngay thay đổi của mình);
+    # các phiên khác dùng `kb`, không phải chờ
+    def latest_kb(self):
+        return self.store.current(wait=True)
+
+    # Nếu chưa có dữ liệu local thì mới tải từ GitHub; trả về danh sách lỗi
+    def refresh(self):
+        if self.store.has_local_data():
+            self.refresh_errors = []
+            return []
+        source = self.store.github_source
+        with span("github_fetch"):
+            self.refresh_errors = source.refresh()
+        if self.refresh_errors:
+            self._schedule_retry()
+        # So với bản đang phục vụ (có thể nạp từ snapshot cũ hơn cache GitHub), không so với trước lúc tải:
+        # chỉ dựng lại khi khác; GitHub lỗi thì giữ nguyên dữ liệu đang phục vụ
+        if ("github", source.snapshot_id) != self.store.served_version():
+            self.store.invalidate()
+        return self.refresh_errors
+
+    # Thử tải lại ở thread nền, không chặn lượt chạy của người dùng nào
+    def _schedule_retry(self):
+        with self._poll_lock:
+            if self._retry_timer is not None:
+                return
+            self._retry_timer = threading.Timer(REFRESH_RETRY_INTERVAL, self._retry_refresh)
+            self._retry_timer.daemon = True
+            self._retry_timer.start()
+
+    def _retry_refresh(self):
+        with self._poll_lock:
+            self._retry_timer = None
+        try:
+            self.refresh()
+        except Exception:
+            self._schedule_retry()
+
+    # === Repo GitHub vừa đổi (webhook / hỏi định kỳ): tải lại, có file đổi thì báo cho các process khác ===
+    def refresh_upstream(self):
+        before = self.store.github_source.snapshot_id
+        errors = self.refresh()
+        if self.stamp is not None and not errors and self.store.github_source.snapshot_id != before:
+            self.stamp.bump("github")
+        return errors
+
+    # Hỏi GitHub định kỳ ở thread nền; gọi nhiều lần chỉ chạy một thread (interval 0: tắt).
+    # Các process dùng chung tem phiên bản thì chỉ một process hỏi rồi tăng tem, các process khác theo tem;
+    # process đó dừng thì process khác nhận việc ở lượt sau
+    def start_upstream_poll(self, interval=UPSTREAM_POLL_INTERVAL):
+        with self._poll_lock:
+            if self._polling or not interval:
+                return
+            self._polling = True
+        threading.Thread(target=self._poll_upstream, args=(interval,), name="kb-upstream-poll", daemon=True).start()
+
+    def _poll_upstream(self, interval):
+        while True:
+            time.sleep(interval)
+            if self.stamp is not None and not self.stamp.claim("upstream-poll"):
+                continue
+            try:
+                self.refresh_upstream()
+            except Exception:
+                # Lỗi bất ngờ (vd. ghi cache) không được làm dừng thread hỏi định kỳ
+                pass
+
+    # Cache giữ lại câu trả lời của từ khóa hay dùng; câu hỏi tự do bị bỏ trước
+    def _answer_weight(self, key):
+        return self.usage.score(key[1]) if key[0] == "lookup" else float("-inf")
+
+    def lookup(self, keyword):
+        kb = self.kb
+        return self.answers.get(
+            kb.version, ("lookup", keyword), lambda: [_answer(*row) for row in kb.index.lookup(keyword)]
+        )
+
+    def lookup_many(self, keywords):
+        return {kw: self.lookup(kw) for kw in keywords}
+
+    # popular=True: trong cùng một bậc khớp, từ khóa hay được chọn lên trước (dùng cho gợi ý của ô tìm kiếm)
+    def search(self, query, limit=None, popular=False):
+        engine = self.kb.search_engine
+        with span("search"):
+            if not popular or self.usage is None:
+                return engine.search(query, limit)
+            limit = limit or engine.limit
+            if not fold_text(query):
+                return self.popular_keywords(limit) or engine.search(query, limit)
+            matches = engine.search_ranked(query, limit * POPULAR_POOL)
+            return self.usage.rank([kw for kw, _ in matches], [tier for _, tier in matches])[:limit]
+
+    def ask(self, question, top_n=3):
+        # Đảm bảo retriever đã đồng bộ với phiên bản dữ liệu hiện tại
+        kb = self.store.current()
+
+        def compute():
+            with span("ask"):
+                return [_answer(*row) for row in self.retriever.search(question, top_n)]
+        return self.answers.get(kb.version, ("ask", fold_text(question), top_n), compute)
+
+    # === Đoán chủ đề của câu hỏi: [(chủ đề, xác suất)], cao nhất trước ===
+    def predict_topics(self, question, n=None):
+        self.store.current()
+        return self.store.classifier.predict(question, n)
+
+    # Các chủ đề nên lọc theo cho câu hỏi này (rỗng: chưa đủ chắc chắn, không lọc)
+    def route_topics(self, question):
+        self.store.current()
+        with span("topic_route"):
+            return self.store.classifier.route(question)
+
+    # === Độ phổ biến: ghi nhận lượt chọn từ khóa (tìm kiếm, danh mục, ghim, chọn nhiều) ===
+    def record_selection(self, keyword):
+        if self.usage is not None:
+            self.usage.record(keyword)
+
+    # Các từ khóa hay dùng nhất còn có trong dữ liệu (lọc theo chủ đề nếu có)
+    def popular_keywords(self, n, topics=None):
+        if self.usage is None:
+            return []
+        index = self.kb.index
+        topics = set(topics or ())
+        result = []
+        for kw in self.usage.top():
+            if index.lookup(kw) and (not topics or index.topics_for_keyword(kw) & topics):
+                result.append(kw)
+                if len(result) == n:
+                    break
+        return result
+
+    def rank_by_popularity(self, keywords):
+        return self.usage.rank(keywords) if self.usage is not None else keywords
+
+    # Các cặp mô tả gần trùng nhau (để admin xem và gộp)
+    def near_duplicates(self):
+        self.store.current()
+        return self.store.near_duplicates.pairs()
+
+    def topics(self):
+        return self.kb.index.all_topics
+
+    def keywords(self, topics=None):
+        return self.kb.index.keywords_for_topics(topics or [])
+
+
+# === Dựng service dùng chung: lần đầu chạy thì chuyển file CSV upload cũ vào SQLite ===
+def create_service(
+    db_file=DB_FILE,
+    uploaded_file=UPLOADED_FILE,
+    api_url=GITHUB_API_URL,
+    cache_dir=GITHUB_CACHE_DIR,
+    stamp_file=STAMP_FILE,
+    snapshot_file=SNAPSHOT_FILE
+):
+    db = KeywordDatabase(db_file)
+    db.import_legacy_csv(uploaded_file)
+    source = GitHubCsvSource(api_url, cache_dir=cache_dir)
+    stamp = VersionStamp(stamp_file) if stamp_file else None
+    store = KnowledgeBaseStore(db, source)
+    service = KnowledgeBaseService(store, stamp, UsageTracker(db_file))
+    if snapshot_file and store.load_snapshot(snapshot_file):
+        # Có snapshot thì phục vụ ngay; GitHub tải lại ở nền, có thay đổi mới dựng lại
+        threading.Thread(target=service.refresh, name="kb-initial-refresh", daemon=True).start()
+    else:
+        service.refresh()
+    return service
@@ -0,0 +1,96 @@
+import argparse
+import gc
+import mmap
+import os
+import pickle
+import struct
+
+SNAPSHOT_FILE = os.environ.get("KB_SNAPSHOT_FILE", "knowledge_base.snapshot")
+SNAPSHOT_FORMAT = 5
+
+# Bố cục file: MAGIC | độ dài header | header | dữ liệu (pickle 5) | các mảng NumPy (mỗi mảng căn 64 byte)
+_MAGIC = b"KBSNAP\x00\x01"
+_LENGTH = struct.Struct("<Q")
+_ALIGN = 64
+
+
+def _aligned(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+# === Ghi snapshot: mảng NumPy nằm ngoài pickle để đọc lại bằng mmap, không phải copy ===
+def write_snapshot(path, kb, retriever, near_duplicates, classifier):
+    buffers = []
+    payload = pickle.dumps(
+        {"kb": kb, "retriever": retriever, "near_duplicates": near_duplicates, "classifier": classifier},
+        protocol=5,
+        buffer_callback=buffers.append
+    )
+    raws = [buffer.raw() for buffer in buffers]
+    # Vị trí các mảng tính từ đầu phần mảng, nên không phụ thuộc độ dài header
+    table, offset = [], 0
+    for raw in raws:
+        table.append((offset, raw.nbytes))
+        offset = _aligned(offset + raw.nbytes)
+    header = pickle.dumps({"format": SNAPSHOT_FORMAT, "payload": len(payload), "buffers": table})
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_MAGIC + _LENGTH.pack(len(header)) + header + payload)
+        base = _aligned(f.tell())
+        for (start, _), raw in zip(table, raws):
+            f.write(b"\0" * (base + start - f.tell()))
+            f.write(raw)
+    os.replace(tmp_path, path)
+
+
+# === Đọc snapshot: trả về dict (kb, retriever, near_duplicates, classifier) hoặc None nếu không dùng được ===
+def read_snapshot(path):
+    try:
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    view = memoryview(data)
+    start = len(_MAGIC) + _LENGTH.size
+    try:
+        if bytes(view[:len(_MAGIC)]) != _MAGIC:
+            return None
+        (header_size,) = _LENGTH.unpack(view[len(_MAGIC):start])
+        header = pickle.loads(view[start:start + header_size])
+        if header.get("format") != SNAPSHOT_FORMAT:
+            return None
+        payload_start = start + header_size
+        payload = view[payload_start:payload_start + header["payload"]]
+        base = _aligned(payload_start + header["payload"])
+        buffers = [view[base + offset:base + offset + size] for offset, size in header["buffers"]]
+        # Tạo hàng triệu object một lượt: tắt GC trong lúc đọc nhanh gần gấp đôi
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return pickle.loads(payload, buffers=buffers)
+        finally:
+            if gc_enabled:
+                gc.enable()
+    except Exception:
+        # File hỏng hoặc của phiên bản code khác: bỏ qua, dựng lại như bình thường
+        return None
+
+
+# === Bước build: gộp CSV từ GitHub + uploaded_keywords.csv (qua SQLite), dựng sẵn chỉ mục rồi ghi ra file ===
+def main():
+    from kb_service import create_service
+
+    parser = argparse.ArgumentParser(description="Build a prebuilt knowledge base snapshot for fast startup")
+    parser.add_argument("--output", default=SNAPSHOT_FILE)
+    args = parser.parse_args()
+    service = create_service(snapshot_file=None)
+    for error in service.refresh_errors:
+        print(f"Warning: {error}")
+    service.store.save_snapshot(args.output)
+    kb = service.kb
+    print(f"Wrote {args.output}: {len(kb.index)} rows, version {kb.version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import threading
+
+from dedup import NearDuplicateIndex
+from kb_index import KnowledgeBaseIndex
+from kb_snapshot import read_snapshot, write_snapshot
+from perf import span
+from retrieval import BM25Retriever
+from search import KeywordSearchEngine
+from topic_classifier import TopicClassifier
+
+
+# Cách loại trùng gốc; SQLite giờ tính sẵn cùng kết quả khi ghi (xem KeywordDatabase.deduped_rows)
+def dedupe(df):
+    df = df.drop_duplicates(subset="key word", keep="last")
+    return df.drop_duplicates(subset="description", keep="first")
+
+
+# === Một phiên bản dữ liệu: không thay đổi sau khi dựng ===
+class KnowledgeBase:
+    def __init__(self, version, records, warnings=()):
+        # records: (keyword, description, topic) đã loại trùng dùng để tra cứu
+        self.version = version
+        self.warnings = list(warnings)
+        with span("index_build"):
+            self.index = KnowledgeBaseIndex(records)
+        with span("search_index_build"):
+            self.search_engine = KeywordSearchEngine.from_kb_index(self.index)
+
+    @property
+    def empty(self):
+        return self.index.empty
+
+
+# === Kho dữ liệu dùng chung cho cả process, dựng lại khi nguồn thay đổi ===
+class KnowledgeBaseStore:
+    def __init__(self, db, github_source):
+        self.db = db
+        self.github_source = github_source
+        self.retriever = BM25Retriever()
+        self.near_duplicates = NearDuplicateIndex()
+        self.classifier = TopicClassifier()
+        self._lock = threading.Lock()
+        self._kb = None
+        self._stale = True
+
+    def has_local_data(self):
+        return self.db.has_data()
+
+    def version(self):
+        if self.has_local_data():
+            return ("local", self.db.version())
+        return ("github", self.github_source.snapshot_id)
+
+    def _build(self, version):
+        warnings = []
+        records = []
+        if version[0] == "local":
+            # Dữ liệu admin đã lưu thì ưu tiên dùng trước
+            try:
+                with span("db_read"):
+                    records = self.db.deduped_rows()
+            except Exception as e:
+                warnings.append(f"Lỗi đọc dữ liệu local: {e}")
+        else:
+            with span("csv_read"):
+                data, errors = self.github_source.load_dataframe()
+                records = zip(data["key word"], data["description"], data["topic"])
+            warnings.extend(errors)
+        kb = KnowledgeBase(version, records, warnings)
+        with span("bm25_sync"):
+            self.retriever.sync(kb.index.iter_rows())
+        with span("near_duplicate_sync"):
+            self.near_duplicates.sync(kb.index.iter_rows())
+        # Admin thêm/đổi tên chủ đề: chỉ học thêm các dòng đổi, không huấn luyện lại từ đầu
+        with span("topic_classifier_sync"):
+            self.classifier.sync(kb.index.iter_rows())
+        return kb
+
+    # === Nạp snapshot dựng sẵn lúc khởi động: không cần GitHub, pandas hay dựng chỉ mục ===
+    def load_snapshot(self, path):
+        with span("snapshot_load"):
+            snapshot = read_snapshot(path)
+        if snapshot is None:
+            return False
+        with self._lock:
+            self._kb = snapshot["kb"]
+            self.retriever = snapshot["retriever"]
+            self.near_duplicates = snapshot["near_duplicates"]
+            self.classifier = snapshot["classifier"]
+            # Dữ liệu local: so version với SQLite ở lần đọc đầu (rẻ).
+            # Dữ liệu GitHub: dùng luôn, tới khi tải lại GitHub xong (invalidate) mới so.
+            self._stale = self._kb.version[0] == "local" or self.has_local_data()
+        return True
+
+    def save_snapshot(self, path):
+        kb = self.current(wait=True)
+        write_snapshot(path, kb, self.retriever, self.near_duplicates, self.classifier)
+
+    # Phiên bản đang phục vụ (None nếu chưa dựng), không dựng lại dù đang cũ
+    def served_version(self):
+        kb = self._kb
+        return kb.version if kb is not None else None
+
+    # Được báo dữ liệu đã đổi (ghi local, tem phiên bản, GitHub): lần đọc sau mới kiểm tra version
+    def invalidate(self):
+        self._stale = True
+
+    # === Lấy phiên bản hiện tại: không truy vấn gì khi chưa có thông báo thay đổi ===
+    # Chỉ lần dựng đầu tiên (hoặc wait=True) mới phải chờ; sau đó bản mới được dựng ở thread nền,
+    # mọi phiên vẫn dùng bản cũ cho tới khi bản mới xong
+    def current(self, wait=False):
+        kb = self._kb
+        if kb is None or wait:
+            # Qua khoá cả khi cờ đã xoá: thread nền có thể đang dựng dở
+            with self._lock:
+                self._rebuild_if_stale()
+            return self._kb
+        if not self._stale:
+            return kb
+        if self._lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild_in_background, name="kb-rebuild", daemon=True).start()
+        return kb
+
+    # Gọi khi đang giữ self._lock
+    def _rebuild_if_stale(self):
+        if self._kb is None or self._stale:
+            # Xoá cờ trước khi đọc version: thông báo đến trong lúc dựng sẽ không bị mất
+            self._stale = False
+            version = self.version()
+            if self._kb is None or self._kb.version != version:
+                with span("kb_build"):
+                    self._kb = self._build(version)
+
+    def _rebuild_in_background(self):
+        try:
+            self._rebuild_if_stale()
+        except Exception:
+            # Dựng lỗi: vẫn phục vụ bản cũ, lần đọc sau thử lại
+            self._stale = True
+        finally:
+            self._lock.release()
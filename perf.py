@@ -0,0 +1,175 @@
+import atexit
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+PERF_RECENT_RERUNS = 50
+PERF_SAMPLES_PER_PHASE = 500
+PERF_FLUSH_EVERY = 20
+
+# Lần chạy script hiện tại của thread này (mỗi rerun Streamlit chạy trên một thread)
+_local = threading.local()
+
+
+# === Đo một đoạn code: gắn vào lần rerun đang chạy trên thread này, không có thì bỏ qua ===
+@contextmanager
+def span(name):
+    rerun = getattr(_local, "rerun", None)
+    if rerun is None:
+        yield
+        return
+    with rerun.span(name):
+        yield
+
+
+# === Các span của một lần chạy script ===
+class Rerun:
+    def __init__(self, recorder, session_id):
+        self.recorder = recorder
+        self.session_id = session_id
+        self.time = datetime.now()
+        self.start = time.perf_counter()
+        self.last = self.start   # lần cuối có span/phase kết thúc hoặc bắt đầu
+        self.spans = []     # (tên, bắt đầu sau đầu rerun, thời gian, độ sâu)
+        self._depth = 0
+        self._phase = None
+        self.total = None
+        self.interrupted = False
+
+    # === Phase nối tiếp nhau ở cấp cao nhất của script: bắt đầu phase mới thì đóng phase cũ ===
+    def phase(self, name):
+        self._close_phase()
+        self.last = time.perf_counter()
+        self._phase = (name, self.last)
+        self._depth = 1
+
+    def _close_phase(self, at=None):
+        if self._phase is not None:
+            name, start = self._phase
+            self.spans.append((name, start - self.start, (at or time.perf_counter()) - start, 0))
+            self._phase = None
+            self._depth = 0
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        depth = self._depth
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.last = time.perf_counter()
+            self.spans.append((name, start - self.start, self.last - start, depth))
+
+    # interrupted=True: script dừng giữa chừng (vd. ngay trước st.rerun()), các phase sau không chạy
+    # at: thời điểm kết thúc (mặc định là bây giờ)
+    def end(self, interrupted=False, at=None):
+        if self.total is not None:
+            return
+        self.interrupted = interrupted
+        self._close_phase(at)
+        self.total = (at or time.perf_counter()) - self.start
+        if getattr(_local, "rerun", None) is self:
+            _local.rerun = None
+        self.recorder.finish(self)
+
+    def to_dict(self):
+        return {
+            "time": self.time.isoformat(timespec="milliseconds"),
+            "session": self.session_id,
+            "total_ms": round(self.total * 1000, 3),
+            "interrupted": self.interrupted,
+            "spans": [
+                {"name": name, "start_ms": round(start * 1000, 3), "ms": round(duration * 1000, 3), "depth": depth}
+                for name, start, duration, depth in sorted(self.spans, key=lambda s: s[1])
+            ]
+        }
+
+
+# === Gom số liệu cho cả process: vài rerun gần nhất, tổng hợp theo phase, ghi JSON lines theo lô ===
+class PerfRecorder:
+    def __init__(self, path=None, recent=PERF_RECENT_RERUNS, flush_every=PERF_FLUSH_EVERY):
+        self.path = path
+        self.flush_every = flush_every
+        self._recent = deque(maxlen=recent)
+        self._phases = {}   # tên -> [số lần, tổng, lớn nhất, mẫu gần đây]
+        self._pending = []
+        self._open = {}     # phiên -> rerun chưa kết thúc
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        if path:
+            atexit.register(self.flush)
+
+    # Rerun trước của phiên chưa kết thúc: script bị dừng giữa chừng (st.rerun() trong component,
+    # Streamlit ngắt khi có tương tác mới, exception) -> ghi lại là bị ngắt, tính đến hoạt động cuối
+    def start(self, session_id):
+        rerun = Rerun(self, session_id)
+        with self._lock:
+            previous = self._open.get(session_id)
+            self._open[session_id] = rerun
+        if previous is not None:
+            previous.end(interrupted=True, at=previous.last)
+        _local.rerun = rerun
+        return rerun
+
+    def finish(self, rerun):
+        record = rerun.to_dict()
+        with self._lock:
+            if self._open.get(rerun.session_id) is rerun:
+                del self._open[rerun.session_id]
+            self._recent.append(record)
+            for name, _, duration, _ in rerun.spans:
+                stats = self._phases.get(name)
+                if stats is None:
+                    stats = self._phases[name] = [0, 0.0, 0.0, deque(maxlen=PERF_SAMPLES_PER_PHASE)]
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = max(stats[2], duration)
+                stats[3].append(duration)
+            if self.path:
+                self._pending.append(json.dumps(record, ensure_ascii=False))
+                flush = len(self._pending) >= self.flush_every
+            else:
+                flush = False
+        if flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            lines, self._pending = self._pending, []
+        if not lines:
+            return
+        try:
+            with self._write_lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError:
+            # Không ghi được file thì vẫn giữ số liệu trong bộ nhớ cho panel admin
+            pass
+
+    # === Các rerun gần nhất, mới nhất trước ===
+    def recent(self, n=None):
+        with self._lock:
+            records = list(self._recent)
+        records.reverse()
+        return records[:n] if n else records
+
+    # === Tổng hợp theo phase, phase tốn nhiều thời gian nhất trước ===
+    def aggregates(self):
+        with self._lock:
+            phases = [(name, count, total, peak, sorted(samples)) for name, (count, total, peak, samples) in self._phases.items()]
+        rows = []
+        for name, count, total, peak, samples in phases:
+            rows.append({
+                "phase": name,
+                "count": count,
+                "total_ms": round(total * 1000, 1),
+                "mean_ms": round(total / count * 1000, 3),
+                "p95_ms": round(samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000, 3),
+                "max_ms": round(peak * 1000, 3)
+            })
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
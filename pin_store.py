@@ -0,0 +1,112 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+
+FLUSH_DELAY = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pinned_keywords (
+    user_id TEXT PRIMARY KEY,
+    keywords TEXT NOT NULL
+);
+"""
+
+
+# === Lưu từ khóa ghim theo người dùng: cache trong bộ nhớ + gộp ghi xuống SQLite ===
+class PinStore:
+    def __init__(self, path, flush_delay=FLUSH_DELAY, legacy_json=None):
+        self.path = path
+        self.flush_delay = flush_delay
+        self._cache = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        if legacy_json and os.path.exists(legacy_json):
+            self._import_legacy(legacy_json)
+        atexit.register(self.flush)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # Chuyển file pinned_keywords.json cũ sang SQLite (chỉ các user chưa có)
+    def _import_legacy(self, legacy_json):
+        try:
+            with open(legacy_json, "r") as f:
+                all_pins = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._connect().executemany(
+            "INSERT OR IGNORE INTO pinned_keywords (user_id, keywords) VALUES (?, ?)",
+            [(user_id, json.dumps(pins, ensure_ascii=False)) for user_id, pins in all_pins.items()]
+        )
+
+    # === Đọc: O(1), chỉ chạm đĩa lần đầu với mỗi user ===
+    def get(self, user_id):
+        with self._lock:
+            if user_id in self._cache:
+                return list(self._cache[user_id])
+        row = self._connect().execute(
+            "SELECT keywords FROM pinned_keywords WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        pins = json.loads(row[0]) if row else []
+        with self._lock:
+            # Có thể đã được ghi trong lúc đọc đĩa: ưu tiên bản trong bộ nhớ
+            pins = self._cache.setdefault(user_id, pins)
+            return list(pins)
+
+    # === Ghi: cập nhật bộ nhớ ngay, ghi đĩa gộp sau `flush_delay` giây ===
+    def set(self, user_id, pins):
+        with self._lock:
+            self._cache[user_id] = list(pins)
+            self._dirty.add(user_id)
+            self._schedule_flush()
+
+    # Gọi khi đang giữ self._lock
+    def _schedule_flush(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        # Tuần tự hoá các lần flush để bản cũ không ghi đè bản mới
+        with self._flush_lock:
+            with self._lock:
+                self._timer = None
+                if not self._dirty:
+                    return
+                rows = [
+                    (user_id, json.dumps(self._cache[user_id], ensure_ascii=False))
+                    for user_id in self._dirty
+                ]
+                self._dirty.clear()
+            conn = self._connect()
+            # Một giao dịch cho mọi thay đổi đang chờ: ghi nguyên tử, an toàn khi crash
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT INTO pinned_keywords (user_id, keywords) VALUES (?, ?) "
+                    "ON CONFLICT (user_id) DO UPDATE SET keywords = excluded.keywords",
+                    rows
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                # Vd. "database is locked": giữ lại các thay đổi và thử ghi lại sau
+                with self._lock:
+                    self._dirty.update(user_id for user_id, _ in rows)
+                    self._schedule_flush()
+                raise
@@ -0,0 +1,188 @@
+import atexit
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+HALF_LIFE_DAYS = 7          # lượt chọn cách đây 1 tuần chỉ còn nửa trọng số
+FLUSH_DELAY = 5.0
+ANSWER_CACHE_SIZE = 1024
+EVICTION_SAMPLE = 16
+
+# Điểm lưu dạng log2(Σ 2^((t - EPOCH) / half_life)): cộng thêm lượt mới không phải giảm dần
+# điểm cũ, so sánh điểm là so sánh độ phổ biến hiện tại, và không bao giờ tràn số
+EPOCH = 1704067200          # 2024-01-01 UTC
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keyword_usage (
+    keyword TEXT PRIMARY KEY,
+    score REAL NOT NULL
+);
+"""
+
+
+def _log2_add(a, b):
+    if a == -math.inf:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+# === Đếm lượt chọn từ khóa (giảm dần theo thời gian): bộ nhớ + gộp ghi xuống SQLite ===
+class UsageTracker:
+    def __init__(self, path, half_life_days=HALF_LIFE_DAYS, flush_delay=FLUSH_DELAY):
+        self.path = path
+        self.half_life = half_life_days * 86400
+        self.flush_delay = flush_delay
+        self._scores = {}
+        self._pending = {}      # lượt chọn chưa ghi: từ khóa -> điểm cần cộng thêm
+        self._ranked = None     # danh sách từ khóa theo độ phổ biến, tính lại khi có lượt mới
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self._scores = dict(conn.execute("SELECT keyword, score FROM keyword_usage"))
+        atexit.register(self.flush)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _weight(self, now):
+        return (now - EPOCH) / self.half_life
+
+    # === Ghi nhận một lượt chọn: O(1), ghi đĩa gộp sau `flush_delay` giây ===
+    def record(self, keyword, now=None):
+        weight = self._weight(time.time() if now is None else now)
+        with self._lock:
+            self._scores[keyword] = _log2_add(self._scores.get(keyword, -math.inf), weight)
+            self._pending[keyword] = _log2_add(self._pending.get(keyword, -math.inf), weight)
+            self._ranked = None
+            self._schedule_flush()
+
+    # Gọi khi đang giữ self._lock
+    def _schedule_flush(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    # Số lượt chọn đã giảm dần tới thời điểm `now`
+    def count(self, keyword, now=None):
+        score = self._scores.get(keyword)
+        if score is None:
+            return 0.0
+        return 2 ** (score - self._weight(time.time() if now is None else now))
+
+    # Chỉ dùng để so sánh: từ khóa chưa ai chọn là -inf
+    def score(self, keyword):
+        return self._scores.get(keyword, -math.inf)
+
+    def top(self, n=None):
+        with self._lock:
+            if self._ranked is None:
+                self._ranked = sorted(self._scores, key=self._scores.get, reverse=True)
+            ranked = self._ranked
+        return ranked[:n] if n else list(ranked)
+
+    # === Từ khóa hay dùng lên trước (theo độ phổ biến), còn lại giữ nguyên thứ tự ===
+    # Có `tiers` (bậc khớp của từng từ khóa): chỉ xếp lại trong cùng một bậc, một lượt chọn
+    # không đẩy được từ khóa khớp kém lên trên từ khóa khớp tốt hơn
+    def rank(self, keywords, tiers=None):
+        scores = self._scores
+        if tiers is not None:
+            order = sorted(range(len(keywords)), key=lambda i: (tiers[i], -scores.get(keywords[i], -math.inf)))
+            return [keywords[i] for i in order]
+        popular = sorted((kw for kw in keywords if kw in scores), key=scores.get, reverse=True)
+        if not popular:
+            return list(keywords)
+        seen = set(popular)
+        return popular + [kw for kw in keywords if kw not in seen]
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                self._timer = None
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            conn = self._connect()
+            # Cộng dồn với điểm trong SQLite (các replica khác cũng ghi vào) rồi đọc lại toàn bộ
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                stored = dict(conn.execute(
+                    f"SELECT keyword, score FROM keyword_usage WHERE keyword IN ({','.join('?' * len(pending))})",
+                    list(pending)
+                ))
+                conn.executemany(
+                    "INSERT INTO keyword_usage (keyword, score) VALUES (?, ?) "
+                    "ON CONFLICT (keyword) DO UPDATE SET score = excluded.score",
+                    [(kw, _log2_add(stored.get(kw, -math.inf), score)) for kw, score in pending.items()]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                # Vd. "database is locked": giữ lại các lượt chọn và thử ghi lại sau
+                with self._lock:
+                    for kw, score in pending.items():
+                        self._pending[kw] = _log2_add(self._pending.get(kw, -math.inf), score)
+                    self._schedule_flush()
+                raise
+            scores = dict(conn.execute("SELECT keyword, score FROM keyword_usage"))
+            with self._lock:
+                # Lượt chọn đến trong lúc đang ghi vẫn phải có mặt trong bảng xếp hạng
+                for kw, score in self._pending.items():
+                    scores[kw] = _log2_add(scores.get(kw, -math.inf), score)
+                self._scores = scores
+                self._ranked = None
+
+
+# === Cache câu trả lời: LRU, khi đầy thì bỏ mục ít phổ biến nhất trong vài mục cũ nhất (LFU gần đúng) ===
+class AnswerCache:
+    def __init__(self, maxsize=ANSWER_CACHE_SIZE, weight=None, sample=EVICTION_SAMPLE):
+        self.maxsize = maxsize
+        self.weight = weight        # weight(key) -> số càng lớn càng nên giữ lại
+        self.sample = sample
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Dữ liệu đổi phiên bản thì bỏ toàn bộ cache cũ
+    def get(self, version, key, compute):
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = value
+                if len(self._entries) > self.maxsize:
+                    self._evict()
+        return value
+
+    def _evict(self):
+        if self.weight is None:
+            self._entries.popitem(last=False)
+            return
+        oldest = [key for key, _ in zip(self._entries, range(self.sample))]
+        del self._entries[min(oldest, key=self.weight)]
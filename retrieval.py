@@ -0,0 +1,167 @@
+import re
+import threading
+
+import numpy as np
+
+from search import fold_text
+
+DEFAULT_TOP_N = 3
+_TOKEN = re.compile(r"\w+")
+_ARRAY_FIELDS = {
+    "_coo_docs": np.int32, "_coo_terms": np.int32, "_coo_tfs": np.int32,
+    "_alive": bool, "_doc_lengths": np.int32
+}
+
+
+# === Tách từ: âm tiết đã bỏ dấu + cặp âm tiết liền kề (vd: "hoc_phi") ===
+def tokenize(text):
+    syllables = _TOKEN.findall(fold_text(text))
+    bigrams = [f"{a}_{b}" for a, b in zip(syllables, syllables[1:])]
+    return syllables + bigrams
+
+
+# === Truy xuất câu trả lời theo câu hỏi tự do (BM25, tính điểm bằng NumPy) ===
+class BM25Retriever:
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()           # giữ khi đọc/ghi các list bên dưới
+        self._sync_lock = threading.Lock()      # chỉ một lượt đồng bộ tại một thời điểm
+        self._vocab = {}
+        self._docs = []          # (keyword, description, topic)
+        self._doc_ids = {}       # (keyword, description, topic) -> doc id
+        self._alive = []
+        self._doc_lengths = []
+        # Ma trận thưa dạng COO, chỉ nối thêm khi có dòng mới
+        self._coo_docs = []
+        self._coo_terms = []
+        self._coo_tfs = []
+        self._matrix = None
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    # === Lưu snapshot: các list COO thành mảng NumPy (ghi thẳng ra file, đọc lại bằng mmap) ===
+    def __getstate__(self):
+        # Gom sẵn ma trận để process mới không phải tính lại
+        self._compile()
+        state = self.__dict__.copy()
+        del state["_lock"], state["_sync_lock"], state["_doc_ids"]
+        for name, dtype in _ARRAY_FIELDS.items():
+            state[name] = np.asarray(state[name], dtype=dtype)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._doc_ids = {row: i for i, (row, alive) in enumerate(zip(self._docs, self._alive)) if alive}
+
+    # Mảng từ snapshot chỉ đọc; đổi lại thành list trước khi thêm/xoá dòng
+    def _thaw(self):
+        for name in _ARRAY_FIELDS:
+            value = getattr(self, name)
+            if isinstance(value, np.ndarray):
+                setattr(self, name, value.tolist())
+
+    def _add(self, row):
+        keyword, description, _ = row
+        doc_id = len(self._docs)
+        counts = {}
+        for token in tokenize(f"{keyword} {description}"):
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            term_id = self._vocab.setdefault(token, len(self._vocab))
+            self._coo_docs.append(doc_id)
+            self._coo_terms.append(term_id)
+            self._coo_tfs.append(tf)
+        self._docs.append(row)
+        self._doc_ids[row] = doc_id
+        self._alive.append(True)
+        self._doc_lengths.append(sum(counts.values()))
+
+    # === Đồng bộ với dữ liệu mới: chỉ tách từ các dòng thêm mới, đánh dấu dòng đã xoá ===
+    def sync(self, records):
+        rows = {(kw, desc, topic) for kw, desc, topic in records if isinstance(desc, str)}
+        with self._sync_lock:
+            # Chỉ lượt đồng bộ (đang giữ _sync_lock) mới sửa _doc_ids nên đọc ở đây không cần _lock
+            removed = [row for row in self._doc_ids if row not in rows]
+            added = [row for row in rows if row not in self._doc_ids]
+            if not removed and not added:
+                return
+            if len(removed) > len(self._doc_ids) // 2:
+                # Đổi gần hết dữ liệu: dựng bản mới bên ngoài khoá rồi thay vào một lượt,
+                # câu hỏi đến trong lúc dựng vẫn dùng bản cũ
+                fresh = BM25Retriever(self.k1, self.b)
+                for row in rows:
+                    fresh._add(row)
+                fields = {k: v for k, v in vars(fresh).items() if k not in ("_lock", "_sync_lock")}
+                with self._lock:
+                    self.__dict__.update(fields)
+                return
+            with self._lock:
+                self._thaw()
+                for row in removed:
+                    self._alive[self._doc_ids.pop(row)] = False
+                for row in added:
+                    self._add(row)
+                self._matrix = None
+
+    def add(self, records):
+        with self._sync_lock, self._lock:
+            self._thaw()
+            for kw, desc, topic in records:
+                if isinstance(desc, str) and (kw, desc, topic) not in self._doc_ids:
+                    self._add((kw, desc, topic))
+            self._matrix = None
+
+    @classmethod
+    def from_kb_index(cls, kb_index):
+        retriever = cls()
+        retriever.sync(kb_index.iter_rows())
+        return retriever
+
+    # === Gom ma trận COO thành dạng CSC (theo cột từ) để tính điểm theo lô ===
+    def _compile(self):
+        with self._lock:
+            if self._matrix is not None:
+                return self._matrix
+            terms = np.asarray(self._coo_terms, dtype=np.int64)
+            order = np.argsort(terms, kind="stable")
+            indptr = np.zeros(len(self._vocab) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(terms, minlength=len(self._vocab)), out=indptr[1:])
+
+            alive = np.asarray(self._alive, dtype=bool)
+            coo_docs = np.asarray(self._coo_docs, dtype=np.int64)
+            docs = coo_docs[order]
+            tfs = np.asarray(self._coo_tfs, dtype=np.float64)[order]
+            lengths = np.asarray(self._doc_lengths, dtype=np.float64)
+            n_docs = max(int(alive.sum()), 1)
+            avgdl = max(lengths[alive].mean(), 1.0) if alive.any() else 1.0
+
+            # Số tài liệu còn hiệu lực chứa mỗi từ -> idf
+            df = np.bincount(terms[alive[coo_docs]], minlength=len(self._vocab))
+            idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+            # Tiền tính phần BM25 không phụ thuộc câu hỏi cho từng ô của ma trận
+            norm = self.k1 * (1 - self.b + self.b * lengths[docs] / avgdl)
+            weights = np.where(alive[docs], tfs * (self.k1 + 1) / (tfs + norm), 0.0)
+
+            # Giữ luôn bảng từ vựng: mã từ phải khớp với ma trận kể cả khi dữ liệu vừa được thay
+            self._matrix = (indptr, docs, weights, idf, len(self._docs), list(self._docs), self._vocab)
+            return self._matrix
+
+    def search(self, query, top_n=DEFAULT_TOP_N):
+        indptr, docs, weights, idf, n_docs, rows, vocab = self._compile()
+        n_terms = len(indptr) - 1
+        term_ids = {vocab.get(t, n_terms) for t in tokenize(query)} - {n_terms}
+        term_ids = [t for t in term_ids if t < n_terms]
+        if not term_ids or not n_docs:
+            return []
+        hit_docs = np.concatenate([docs[indptr[t]:indptr[t + 1]] for t in term_ids])
+        hit_scores = np.concatenate([weights[indptr[t]:indptr[t + 1]] * idf[t] for t in term_ids])
+        scores = np.bincount(hit_docs, weights=hit_scores, minlength=n_docs)
+
+        top_n = min(top_n, n_docs)
+        best = np.argpartition(-scores, top_n - 1)[:top_n]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [rows[i] for i in best if scores[i] > 0]
@@ -0,0 +1,214 @@
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+DEFAULT_LIMIT = 20
+CACHE_SIZE = 4096
+PREFIX_RANGE_SCAN = 256    # dải tiền tố lớn hơn thế này thì quét theo thứ hạng thay vì xếp cả dải
+DESCRIPTION_SCAN = 2000     # số ứng viên tối đa xét khi khớp mô tả, giữ độ trễ mỗi lần gõ phím ở mức vài ms
+
+# Thứ hạng kết quả: khớp đầu từ khóa > khớp đầu một từ > khớp giữa chuỗi > khớp mô tả
+RANK_PREFIX = 0
+RANK_WORD_PREFIX = 1
+RANK_SUBSTRING = 2
+RANK_DESCRIPTION = 3
+
+_WHITESPACE = re.compile(r"\s+")
+_TOKEN = re.compile(r"\w+")
+
+
+# === Chuẩn hoá: bỏ dấu tiếng Việt, chữ thường, gộp khoảng trắng ===
+def fold_text(text):
+    text = unicodedata.normalize("NFD", str(text).lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.replace("đ", "d")
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _prefix_bounds(sorted_strings, prefix):
+    # Vị trí [start, end) của các chuỗi bắt đầu bằng prefix trong danh sách đã sắp xếp
+    return bisect_left(sorted_strings, prefix), bisect_left(sorted_strings, prefix + "\uffff")
+
+
+def _contains(sorted_positions, position):
+    i = bisect_left(sorted_positions, position)
+    return i < len(sorted_positions) and sorted_positions[i] == position
+
+
+# === Bộ máy tìm kiếm từ khóa cho st_searchbox ===
+class KeywordSearchEngine:
+    def __init__(self, keywords, descriptions=None, limit=DEFAULT_LIMIT, cache_size=CACHE_SIZE):
+        self.keywords = list(keywords)
+        self.limit = limit
+        self._folded = [fold_text(kw) for kw in self.keywords]
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()     # cache dùng chung cho mọi phiên và các thread của API
+
+        # Mỗi vị trí đầu từ trong từ khóa: (phần còn lại từ vị trí đó, khóa xếp hạng)
+        suffixes = []
+        for kw_id, folded in enumerate(self._folded):
+            pos = 0
+            for word in folded.split(" "):
+                rank = RANK_PREFIX if pos == 0 else RANK_WORD_PREFIX
+                suffixes.append((folded[pos:], self._sort_key(rank, kw_id)))
+                pos += len(word) + 1
+        suffixes.sort()
+        self._suffix_strings = [suffix for suffix, _ in suffixes]
+        self._suffix_keys = [key for _, key in suffixes]
+
+        # Từ khóa xếp theo thứ hạng trong cùng một bậc (ngắn trước, rồi theo chữ cái): quét theo thứ tự này
+        # thì gặp kết quả tốt nhất trước và dừng được ngay khi đủ
+        self._by_rank = sorted(range(len(self._folded)), key=lambda kw_id: self._sort_key(0, kw_id))
+        # Mỗi từ khóa đứng sau một "\n", theo thứ hạng: tìm chuỗi con bằng str.find (kể cả truy vấn 1-2 ký tự)
+        self._ranked_text = "".join("\n" + self._folded[kw_id] for kw_id in self._by_rank)
+        self._ranked_offsets = []
+        offset = 0
+        for kw_id in self._by_rank:
+            self._ranked_offsets.append(offset)
+            offset += len(self._folded[kw_id]) + 1
+
+        # Từ trong mô tả -> danh sách vị trí thứ hạng (tăng dần) của các từ khóa có từ đó
+        self._description_index = {}
+        if descriptions is not None:
+            for position, kw_id in enumerate(self._by_rank):
+                for token in set(_TOKEN.findall(fold_text(descriptions[kw_id] or ""))):
+                    self._description_index.setdefault(token, []).append(position)
+        self._description_vocab = sorted(self._description_index)
+
+    @classmethod
+    def from_kb_index(cls, kb_index, include_descriptions=True, limit=DEFAULT_LIMIT):
+        keywords = kb_index.all_keywords
+        descriptions = None
+        if include_descriptions:
+            descriptions = [
+                " ".join(str(desc) for _, desc, _ in kb_index.lookup(kw) if isinstance(desc, str))
+                for kw in keywords
+            ]
+        return cls(keywords, descriptions, limit=limit)
+
+    def __len__(self):
+        return len(self.keywords)
+
+    # Snapshot không mang theo cache kết quả tìm kiếm
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cache"] = OrderedDict()
+        del state["_cache_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache_lock = threading.Lock()
+
+    def _sort_key(self, rank, kw_id):
+        return (rank, len(self._folded[kw_id]), self._folded[kw_id], kw_id)
+
+    # `needed` từ khóa tốt nhất chứa `needle` mà chưa có trong `found` (một lần str.find cho mỗi kết quả)
+    def _text_matches(self, needle, needed, found):
+        text, offsets = self._ranked_text, self._ranked_offsets
+        matched = []
+        pos = text.find(needle)
+        while pos != -1 and len(matched) < needed:
+            position = bisect_right(offsets, pos) - 1
+            kw_id = self._by_rank[position]
+            if kw_id not in found:
+                matched.append(kw_id)
+            if position + 1 == len(offsets):
+                break
+            pos = text.find(needle, offsets[position + 1])
+        return matched
+
+    def _prefix_matches(self, query, limit):
+        start, end = _prefix_bounds(self._suffix_strings, query)
+        if end - start <= PREFIX_RANGE_SCAN:
+            best = {}
+            for rank, _, _, kw_id in self._suffix_keys[start:end]:
+                if rank < best.get(kw_id, RANK_DESCRIPTION + 1):
+                    best[kw_id] = rank
+            return best
+        # Dải khớp lớn (truy vấn ngắn, phổ biến): quét theo thứ hạng sẽ đủ `limit` từ khóa rất sớm,
+        # thay vì xếp hạng cả dải
+        best = {}
+        for rank, needle in ((RANK_PREFIX, "\n" + query), (RANK_WORD_PREFIX, " " + query)):
+            for kw_id in self._text_matches(needle, limit - len(best), best):
+                best[kw_id] = rank
+            if len(best) == limit:
+                break
+        return best
+
+    # `needed` từ khóa tốt nhất có mô tả chứa mọi từ của query (từ cuối có thể đang gõ dở)
+    def _description_matches(self, query, needed, found):
+        tokens = _TOKEN.findall(query)
+        if not tokens:
+            return []
+        *whole, last = tokens
+        required = sorted((self._description_index.get(token, []) for token in whole), key=len)
+        if required and not required[0]:
+            return []
+        start, end = _prefix_bounds(self._description_vocab, last)
+        expansion = [self._description_index[token] for token in self._description_vocab[start:end]]
+        if not expansion:
+            return []
+
+        # Duyệt theo thứ hạng từ danh sách ngắn hơn: các từ đã gõ xong, hoặc mọi từ bắt đầu bằng từ cuối
+        if required and len(required[0]) < sum(len(positions) for positions in expansion):
+            candidates, required, any_of = required[0], required[1:], expansion
+        else:
+            candidates, any_of = heapq.merge(*expansion), None
+
+        matched = []
+        previous = None
+        for scanned, position in enumerate(candidates):
+            if scanned == DESCRIPTION_SCAN or len(matched) == needed:
+                break
+            if position == previous:
+                continue
+            previous = position
+            if not all(_contains(positions, position) for positions in required):
+                continue
+            if any_of is not None and not any(_contains(positions, position) for positions in any_of):
+                continue
+            kw_id = self._by_rank[position]
+            if kw_id not in found:
+                matched.append(kw_id)
+        return matched
+
+    # === Tìm kiếm: trả về tối đa `limit` từ khóa đã xếp hạng ===
+    def search(self, query, limit=None):
+        return [kw for kw, _ in self.search_ranked(query, limit)]
+
+    # Như search() nhưng kèm bậc khớp (RANK_*) của từng từ khóa: [(từ khóa, bậc)]
+    def search_ranked(self, query, limit=None):
+        limit = limit or self.limit
+        query = fold_text(query)
+        if not query:
+            return [(kw, RANK_PREFIX) for kw in self.keywords[:limit]]
+
+        cache_key = (query, limit)
+        with self._cache_lock:
+            if cache_key in self._cache:
+                self._cache.move_to_end(cache_key)
+                return self._cache[cache_key]
+
+        best = self._prefix_matches(query, limit)
+
+        if len(best) < limit:
+            for kw_id in self._text_matches(query, limit - len(best), best):
+                best[kw_id] = RANK_SUBSTRING
+
+        if len(best) < limit and self._description_index:
+            for kw_id in self._description_matches(query, limit - len(best), best):
+                best[kw_id] = RANK_DESCRIPTION
+
+        top = heapq.nsmallest(limit, (self._sort_key(rank, kw_id) for kw_id, rank in best.items()))
+        results = [(self.keywords[key[-1]], key[0]) for key in top]
+
+        with self._cache_lock:
+            self._cache[cache_key] = results
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return results
@@ -0,0 +1,58 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kb_db import KeywordDatabase
+from kb_index import is_missing
+from kb_store import dedupe
+
+KEYWORDS = [f"kw{i}" for i in range(12)]
+TOPICS = ["Admissions", "Majors", "Tuition"]
+# Mô tả không khác nhau chỉ ở khoảng trắng / dạng Unicode: content_hash coi những cái đó là một
+DESCRIPTIONS = [f"mô tả {i}" for i in range(8)] + [None]
+
+
+def _random_rows(rng, n):
+    return [(rng.choice(KEYWORDS), rng.choice(DESCRIPTIONS), rng.choice(TOPICS)) for _ in range(n)]
+
+
+def _random_write(db, rng):
+    op = rng.randrange(7)
+    if op == 0:
+        db.upsert(*_random_rows(rng, 1)[0])
+    elif op == 1:
+        db.upsert_many(_random_rows(rng, rng.randint(1, 6)))
+    elif op == 2:
+        db.delete(rng.choice(TOPICS), rng.sample(KEYWORDS, rng.randint(1, 3)))
+    elif op == 3:
+        db.rename_topic(rng.choice(TOPICS), rng.choice(TOPICS))
+    elif op == 4:
+        topic = rng.choice(TOPICS)
+        rows = [(kw, desc, topic) for kw, desc, _ in _random_rows(rng, rng.randint(0, 5))]
+        db.replace_topic(topic, rows)
+    elif op == 5:
+        db.delete_topic(rng.choice(TOPICS))
+    else:
+        # Tải nhiều file một lượt; file thứ hai lỗi giữa chừng thì chỉ phần của nó bị huỷ
+        def broken():
+            yield _random_rows(rng, 2)
+            raise ValueError("file hỏng")
+        db.upsert_sources([("a.csv", [_random_rows(rng, 3)]), ("b.csv", broken()), ("c.csv", [_random_rows(rng, 2)])])
+
+
+# === Cờ latest/visible tính khi ghi phải khớp với dedupe() của pandas sau mỗi lần ghi ===
+@pytest.mark.parametrize("seed", range(5))
+def test_deduped_rows_match_pandas_dedupe(tmp_path, seed):
+    rng = random.Random(seed)
+    db = KeywordDatabase(str(tmp_path / "kb.db"))
+    for _ in range(80):
+        _random_write(db, rng)
+        expected = [
+            (kw, None if is_missing(desc) else desc, topic)
+            for kw, desc, topic in dedupe(db.to_dataframe()).itertuples(index=False)
+        ]
+        assert db.deduped_rows() == expected
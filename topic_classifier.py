@@ -0,0 +1,184 @@
+import threading
+import unicodedata
+
+import numpy as np
+
+NGRAM_SIZES = (3, 4, 5)
+N_FEATURES = 1 << 16        # số ô băm; đụng độ giữa các n-gram hiếm thì naive Bayes vẫn chịu được
+ALPHA = 0.01                # làm trơn; nhỏ so với trọng số mỗi n-gram để chủ đề nhiều dòng không lấn át
+KEYWORD_WEIGHT = 3          # từ khóa giống câu hỏi của người gọi hơn mô tả nên nặng hơn
+ROW_WEIGHT = 100            # mỗi dòng góp tổng trọng số như nhau, mô tả dài không lấn át chủ đề
+TRAIN_BATCH = 4096          # số dòng băm mỗi lượt khi học, giới hạn bộ nhớ tạm
+# n-gram chồng lên nhau không độc lập: dùng điểm trung bình mỗi n-gram, nhân SHARPNESS.
+# ALPHA/SHARPNESS chọn theo log-loss trên câu hỏi giữ lại (leave-one-out) với dữ liệu CSV hiện có
+SHARPNESS = 3
+ROUTE_COVERAGE = 0.9        # chỉ gợi ý khi 1-2 chủ đề đầu đã chiếm 90% xác suất
+ROUTE_MAX_TOPICS = 2
+
+_FNV_OFFSET = np.uint32(2166136261)
+_FNV_PRIME = np.uint32(16777619)
+
+
+# === Băm n-gram ký tự (đã bỏ dấu) của nhiều đoạn văn một lượt: trả về (chỉ số đoạn, ô băm) ===
+def hashed_ngrams(texts):
+    # Giống fold_text nhưng làm một lần cho cả lô: tách dấu (NFD) rồi bỏ các byte UTF-8 của dấu
+    # (U+0300..U+036F = 0xCC 0x80..0xCD 0xAF) bằng NumPy, thay vì duyệt từng ký tự
+    joined = " \0 ".join(str(text).replace("\0", " ") for text in texts)
+    joined = unicodedata.normalize("NFD", joined.lower()).replace("đ", "d")
+    joined = f" {' '.join(joined.split())} \0"
+    raw = np.frombuffer(joined.encode("utf-8"), dtype=np.uint8)
+    marks = np.flatnonzero((raw[:-1] == 0xCC) | ((raw[:-1] == 0xCD) & (raw[1:] <= 0xAF)))
+    keep = np.ones(len(raw), dtype=bool)
+    keep[marks] = False
+    keep[marks + 1] = False
+    longest = max(NGRAM_SIZES)
+    data = np.concatenate([raw[keep], np.zeros(longest - 1, dtype=np.uint8)]).astype(np.uint32)
+    # Byte ngăn cách (và phần đệm cuối) thuộc đoạn -1 nên n-gram nào vắt qua hai đoạn đều bị loại
+    separators = data == 0
+    owner = np.cumsum(separators)
+    owner[separators] = -1
+
+    # FNV-1a cuộn: băm n-gram dài k + 1 từ băm của n-gram dài k, một lượt cho mọi độ dài
+    count = len(data) - longest + 1
+    start = owner[:count]
+    h = np.full(count, _FNV_OFFSET, dtype=np.uint32)
+    docs, buckets = [], []
+    for k in range(longest):
+        np.bitwise_xor(h, data[k:k + count], out=h)
+        np.multiply(h, _FNV_PRIME, out=h)
+        if k + 1 in NGRAM_SIZES:
+            valid = (start == owner[k:k + count]) & (start >= 0)
+            docs.append(start[valid])
+            buckets.append(h[valid] & np.uint32(N_FEATURES - 1))
+    return np.concatenate(docs), np.concatenate(buckets).astype(np.int64)
+
+
+# === Số đếm n-gram theo chủ đề: bản sao riêng của một lượt đồng bộ, xong mới đem ra phục vụ ===
+class _TopicCounts:
+    def __init__(self, topic_ids, topics, counts, totals, doc_counts):
+        self.topic_ids = dict(topic_ids)
+        self.topics = list(topics)
+        # np.array luôn chép: mảng đang phục vụ (hoặc đọc từ snapshot, chỉ đọc) không bị sửa tại chỗ
+        self.counts = np.array(counts, dtype=np.float64)
+        self.totals = np.array(totals, dtype=np.float64)
+        self.doc_counts = np.array(doc_counts, dtype=np.int64)
+
+    @classmethod
+    def empty(cls):
+        return cls({}, [], np.zeros((0, N_FEATURES)), np.zeros(0), np.zeros(0, dtype=np.int64))
+
+    def model(self):
+        return self.topic_ids, tuple(self.topics), self.counts, self.totals, self.doc_counts
+
+    def _topic_id(self, topic):
+        topic_id = self.topic_ids.get(topic)
+        if topic_id is None:
+            # Chủ đề mới (admin thêm hoặc đổi tên): thêm một hàng, không phải học lại từ đầu
+            topic_id = self.topic_ids[topic] = len(self.topics)
+            self.topics.append(topic)
+            self.counts = np.vstack([self.counts, np.zeros((1, N_FEATURES))])
+            self.totals = np.append(self.totals, 0.0)
+            self.doc_counts = np.append(self.doc_counts, 0)
+        return topic_id
+
+    def update(self, rows, sign):
+        for start in range(0, len(rows), TRAIN_BATCH):
+            self._update_batch(rows[start:start + TRAIN_BATCH], sign)
+
+    def _update_batch(self, rows, sign):
+        labels = np.fromiter((self._topic_id(topic) for _, _, topic in rows), dtype=np.int64, count=len(rows))
+        # Đoạn 2i là từ khóa, 2i + 1 là mô tả của dòng i
+        docs, buckets = hashed_ngrams([text for kw, desc, _ in rows for text in (kw, desc)])
+        weights = np.where(docs & 1, 1.0, KEYWORD_WEIGHT)
+        docs >>= 1
+        weights *= ROW_WEIGHT / np.bincount(docs, weights=weights, minlength=len(rows))[docs]
+        flat = np.bincount(
+            labels[docs] * N_FEATURES + buckets, weights=weights, minlength=len(self.topics) * N_FEATURES
+        )
+        delta = flat.reshape(len(self.topics), N_FEATURES)
+        self.counts += sign * delta
+        self.totals += sign * delta.sum(axis=1)
+        self.doc_counts += sign * np.bincount(labels, minlength=len(self.topics))
+
+
+# === Đoán chủ đề của câu hỏi (naive Bayes trên n-gram ký tự đã băm), học thêm khi dữ liệu đổi ===
+class TopicClassifier:
+    def __init__(self, alpha=ALPHA, sharpness=SHARPNESS):
+        self.alpha = alpha
+        self.sharpness = sharpness
+        self._lock = threading.Lock()
+        self._rows = set()          # (keyword, description, topic) đã học
+        # Mô hình đang phục vụ: (mã chủ đề, chủ đề, số đếm, tổng, số dòng). Chỉ thay cả bộ một lượt,
+        # nên predict() đọc không cần khoá
+        self._model = _TopicCounts.empty().model()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def topics(self):
+        _, topics, _, _, doc_counts = self._model
+        return [topic for topic, n in zip(topics, doc_counts) if n]
+
+    # === Đồng bộ với dữ liệu mới: chỉ học các dòng thêm mới, trừ đi các dòng đã xoá ===
+    def sync(self, records):
+        rows = {(kw, desc, topic) for kw, desc, topic in records if isinstance(desc, str)}
+        with self._lock:
+            removed = [row for row in self._rows if row not in rows]
+            added = [row for row in rows if row not in self._rows]
+            if not removed and not added:
+                return
+            if len(removed) > len(self._rows) // 2:
+                counts = _TopicCounts.empty()
+                removed, added = [], list(rows)
+            else:
+                counts = _TopicCounts(*self._model)
+            counts.update(removed, -1)
+            counts.update(added, 1)
+            self._model = counts.model()
+            self._rows = rows
+
+    @classmethod
+    def from_kb_index(cls, kb_index):
+        classifier = cls()
+        classifier.sync(kb_index.iter_rows())
+        return classifier
+
+    # === Xác suất từng chủ đề cho một câu hỏi, cao nhất trước ===
+    def predict(self, text, n=None):
+        _, topics, counts, totals, doc_counts = self._model
+        live = doc_counts > 0
+        if not live.any():
+            return []
+        _, buckets = hashed_ngrams([text])
+        if not len(buckets):
+            return []
+        buckets, freq = np.unique(buckets, return_counts=True)
+        likelihood = np.log(counts[:, buckets] + self.alpha) @ freq
+        likelihood -= freq.sum() * np.log(totals + self.alpha * N_FEATURES)
+        # Không dùng tỉ lệ số dòng làm tiên nghiệm: chủ đề ít dòng (vd. Tuition) không bị lấn át
+        scores = self.sharpness * likelihood / freq.sum()
+        scores[~live] = -np.inf
+        probs = np.exp(scores - scores.max())
+        probs /= probs.sum()
+        order = np.argsort(-probs, kind="stable")[:int(live.sum())]
+        return [(topics[i], float(probs[i])) for i in order[:n]]
+
+    # Các chủ đề nên gợi ý: ít chủ đề nhất đủ `coverage` xác suất; không chắc chắn thì trả về rỗng
+    def route(self, text, coverage=ROUTE_COVERAGE, max_topics=ROUTE_MAX_TOPICS):
+        result, total = [], 0.0
+        for topic, prob in self.predict(text, max_topics):
+            result.append(topic)
+            total += prob
+            if total >= coverage:
+                return result
+        return []